@@ -0,0 +1,227 @@
+import asyncio
+import csv
+import json
+import sys
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Type, Union
+
+from db import DEFAULT_DB_PATH, SceneWriter, completed_scene_ids, stored_versions
+from extraction_chain.cache import ResponseCache
+from extraction_chain.coalescing import RequestCoalescer
+from extraction_chain.extraction_chain import DEFAULT_MAX_REPAIRS, async_extraction_chain
+from extraction_chain.instrumentation import current_scene_id
+from extraction_chain.versioning import partial_model, schema_version, stale_layers
+
+if TYPE_CHECKING:
+    from pydantic import BaseModel
+
+    from extraction_chain.frames import FrameSampler
+    from extraction_chain.routing import CascadeRouter
+    from extraction_chain.versioning import SchemaVersion
+
+DEFAULT_CONCURRENCY = 8
+
+
+def load_scenes(path: Union[str, Path]) -> Iterator[Dict[str, Any]]:
+    """
+    Yields {"scene_id": ..., "text": ...} records from a JSONL or CSV file.
+    CSV files must have a header row with `scene_id` and `text` columns.
+
+    A scene may also list video frames under `frames`: a directory, a glob pattern or
+    (JSONL only) a list of image paths. Such a scene may leave `text` empty.
+    """
+    path = Path(path)
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.suffix.lower() == ".csv":
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for line_no, row in enumerate(rows, start=1):
+            scene_id = row.get("scene_id")
+            text = row.get("text")
+            frames = row.get("frames")
+            if not scene_id or not (text or frames):
+                raise ValueError(f"{path}:{line_no}: each scene needs a scene_id and text or frames")
+            scene = {"scene_id": str(scene_id), "text": text or ""}
+            if frames:
+                scene["frames"] = frames
+            yield scene
+
+
+async def run_batch(
+    scenes: List[Dict[str, Any]],
+    data_model: Type["BaseModel"],
+    prompt_template: str,
+    reasoning_model: str,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    db_path: Optional[Union[str, Path]] = DEFAULT_DB_PATH,
+    cache: Optional[ResponseCache] = None,
+    storage: str = "json",
+    resume: bool = False,
+    structured: bool = False,
+    max_repairs: int = DEFAULT_MAX_REPAIRS,
+    router: Optional["CascadeRouter"] = None,
+    stream: bool = False,
+    sampler: Optional["FrameSampler"] = None,
+    version: Optional["SchemaVersion"] = None,
+) -> Dict[str, int]:
+    """
+    Runs every scene through async_extraction_chain with at most `concurrency`
+    requests in flight. Results are queued to a SceneWriter as each one finishes and
+    committed in batches (skip writes with db_path=None). A failed scene is reported and does not stop the batch.
+
+    Each scene's progress is tracked in the `jobs` table. With resume=True, scenes
+    already marked done are skipped, so only failed, interrupted and new scenes run.
+
+    Scenes with identical text that are in flight at the same time share one model
+    call, and the result is stored under each scene_id. stats["coalesced"] counts the
+    calls saved this way.
+
+    With a router (a CascadeRouter), each scene goes through its model cascade and
+    reasoning_model is not used.
+
+    With stream=True, responses are validated field by field as they stream in and
+    abandoned at the first invalid field (not supported together with a router).
+
+    Scenes with `frames` have their keyframes picked and encoded by `sampler` (in a
+    worker thread, off the event loop) and sent as images with the text.
+
+    version (a SchemaVersion) is stored with every row; when it names layers, the
+    results cover only those layers and replace just them in the stored rows.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    if stream and router is not None:
+        raise ValueError("streaming is not supported with a cascade router")
+    if router is not None and any(scene.get("frames") for scene in scenes):
+        raise ValueError("frames are not supported with a cascade router")
+    if sampler is None and any(scene.get("frames") for scene in scenes):
+        raise ValueError("scenes with frames need a FrameSampler")
+    if resume and db_path is None:
+        raise ValueError("resume needs a database to read job state from")
+    semaphore = asyncio.Semaphore(concurrency)
+    coalescer = RequestCoalescer()
+
+    skipped = 0
+    if resume:
+        done = completed_scene_ids(db_path)
+        remaining = [scene for scene in scenes if scene["scene_id"] not in done]
+        skipped = len(scenes) - len(remaining)
+        scenes = remaining
+
+    async def process(scene: Dict[str, Any]) -> Dict[str, Any]:
+        # each task runs in its own copy of the context, so this only tags this scene's events
+        current_scene_id.set(scene["scene_id"])
+        async with semaphore:
+            if writer is not None:
+                writer.start_job(scene["scene_id"], time.time())
+            try:
+                if router is not None:
+                    result = await router.aextract(
+                        scene["text"],
+                        data_model,
+                        prompt_template,
+                        cache=cache,
+                        structured=structured,
+                        max_repairs=max_repairs,
+                        coalescer=coalescer,
+                    )
+                else:
+                    images = None
+                    if scene.get("frames"):
+                        images = await asyncio.to_thread(sampler.prepare, scene["frames"])
+                    result = await async_extraction_chain(
+                        input=scene["text"],
+                        data_model=data_model,
+                        prompt_template=prompt_template,
+                        reasoning_model=reasoning_model,
+                        cache=cache,
+                        structured=structured,
+                        max_repairs=max_repairs,
+                        coalescer=coalescer,
+                        stream=stream,
+                        images=images,
+                    )
+            except Exception as exc:  # one bad scene should not kill the run
+                return {"scene_id": scene["scene_id"], "error": exc}
+        return {"scene_id": scene["scene_id"], "result": result}
+
+    writer = None
+    if db_path is not None:
+        writer = SceneWriter(db_path, data_model=data_model, storage=storage)
+    tasks = [asyncio.create_task(process(scene)) for scene in scenes]
+    stats = {"ok": 0, "failed": 0, "skipped": skipped, "coalesced": 0}
+    try:
+        for finished in asyncio.as_completed(tasks):
+            item = await finished
+            if "error" in item:
+                stats["failed"] += 1
+                print(f"{item['scene_id']}: failed: {item['error']!r}", file=sys.stderr)
+                if writer is not None:
+                    writer.finish_job(item["scene_id"], time.time(), error=repr(item["error"]))
+                continue
+            if writer is not None:
+                try:
+                    writer.put(item["result"], scene_id=item["scene_id"], version=version)
+                except ValueError as exc:  # e.g. a value that does not fit the coded format
+                    stats["failed"] += 1
+                    writer.finish_job(item["scene_id"], time.time(), error=repr(exc))
+                    continue
+                writer.finish_job(item["scene_id"], time.time())
+            stats["ok"] += 1
+    finally:
+        if writer is not None:
+            writer.close()
+    stats["coalesced"] = coalescer.saved
+    return stats
+
+
+async def reextract_stale(
+    scenes: List[Dict[str, Any]],
+    data_model: Type["BaseModel"],
+    prompt_template: str,
+    reasoning_model: str,
+    db_path: Union[str, Path] = DEFAULT_DB_PATH,
+    model_label: Optional[str] = None,
+    **kwargs: Any,
+) -> Dict[str, Any]:
+    """
+    Re-runs only the stored scenes whose schema version no longer matches
+    data_model, prompt_template and the model (model_label, default reasoning_model).
+    Scenes not yet in the database, and rows already current, are skipped.
+
+    For a layered data model (see versioning.layer_models), a row where only some
+    layers are stale has just those layers re-extracted and replaced. Other keyword
+    arguments go to run_batch.
+    """
+    version = schema_version(data_model, prompt_template, model_label or reasoning_model)
+    stored = stored_versions(db_path)
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    stats: Dict[str, Any] = {"ok": 0, "failed": 0, "stale": 0, "current": 0, "missing": 0, "coalesced": 0, "layers": {}}
+    for scene in scenes:
+        if scene["scene_id"] not in stored:
+            stats["missing"] += 1
+            continue
+        layers = stale_layers(version, *stored[scene["scene_id"]])
+        if layers is None:
+            stats["current"] += 1
+            continue
+        stats["stale"] += 1
+        groups.setdefault(layers, []).append(scene)
+
+    for layers, group in groups.items():
+        model = partial_model(data_model, layers) if layers else data_model
+        result = await run_batch(
+            group,
+            model,
+            prompt_template,
+            reasoning_model,
+            db_path=db_path,
+            version=version.for_layers(layers),
+            **kwargs,
+        )
+        stats["layers"][",".join(layers) or "all"] = len(group)
+        for key in ("ok", "failed", "coalesced"):
+            stats[key] += result[key]
+    return stats
@@ -0,0 +1,56 @@
+"""
+Per-call prompt construction cost: rebuilding the parser/schema/template for every
+scene (the old extraction_chain behaviour) vs. reusing a cached CompiledChain.
+
+    python benchmarks/bench_compile.py --iterations 500
+"""
+import argparse
+import os
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.prompts import PromptTemplate
+
+from extraction_chain.data_models import ComprehensionLayer, PerceptionLayer, SocialNormativeContext
+from extraction_chain.extraction_chain import compile_chain
+from extraction_chain.prompt_template import prompt_template
+
+SCENE = "A man raises his voice at a librarian while other patrons look up from their books."
+
+
+def uncached(data_model) -> str:
+    parser = PydanticOutputParser(pydantic_object=data_model)
+    prompt = PromptTemplate(
+        template=prompt_template,
+        input_variables=["input"],
+        partial_variables={"format_instructions": parser.get_format_instructions()},
+    )
+    return prompt.invoke({"input": SCENE}).to_string()
+
+
+def compiled(data_model) -> str:
+    return compile_chain(data_model, prompt_template).render(SCENE)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'model':<24}{'uncached us/call':>18}{'compiled us/call':>18}{'speedup':>10}")
+    for data_model in (SocialNormativeContext, PerceptionLayer, ComprehensionLayer):
+        assert uncached(data_model) == compiled(data_model)
+        slow = timeit.timeit(lambda: uncached(data_model), number=args.iterations)
+        fast = timeit.timeit(lambda: compiled(data_model), number=args.iterations)
+        per_slow = slow / args.iterations * 1e6
+        per_fast = fast / args.iterations * 1e6
+        print(f"{data_model.__name__:<24}{per_slow:>18.1f}{per_fast:>18.1f}{per_slow / per_fast:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Rows/sec for db.store_scene (one connection + commit per scene) vs. SceneWriter
+(one long-lived WAL connection, batched transactions, fed by several producer threads).
+
+    python benchmarks/bench_db_writer.py --rows 5000 --producers 8
+"""
+import argparse
+import json
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db import SceneWriter, store_scene
+
+SAMPLE = json.loads((Path(__file__).resolve().parent.parent / "output.json").read_text())
+
+
+def bench_store_scene(db_path: Path, rows: int) -> float:
+    start = time.perf_counter()
+    for i in range(rows):
+        store_scene(SAMPLE, db_path, scene_id=f"S{i:08d}")
+    return rows / (time.perf_counter() - start)
+
+
+def bench_writer(db_path: Path, rows: int, producers: int) -> float:
+    def produce(writer: SceneWriter, offset: int) -> None:
+        for i in range(offset, rows, producers):
+            writer.put(SAMPLE, scene_id=f"S{i:08d}")
+
+    start = time.perf_counter()
+    with SceneWriter(db_path) as writer:
+        threads = [threading.Thread(target=produce, args=(writer, n)) for n in range(producers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert writer.written == rows
+    return rows / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--producers", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        per_call = bench_store_scene(Path(tmp) / "per_call.db", args.rows)
+        batched = bench_writer(Path(tmp) / "writer.db", args.rows, args.producers)
+
+    print(f"{'store_scene':<28}{per_call:>12.0f} rows/s")
+    print(f"{f'SceneWriter ({args.producers} producers)':<28}{batched:>12.0f} rows/s")
+    print(f"{'speedup':<28}{batched / per_call:>11.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Keyframe selection on a synthetic video: frames kept, image tokens and bytes sent,
+and FrameSampler.prepare time with a cold and a warm FrameCache, against sending
+every frame at full resolution.
+
+The video is a few "shots" (a background and two figures, drawn with Pillow), each a
+run of frames with small motion and sensor noise, saved as JPEG files. Keep them
+with --out to try `main.py --frames DIR`.
+
+    python benchmarks/bench_frames.py --shots 6 --frames-per-shot 40
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from extraction_chain.frames import DEFAULT_MAX_FRAMES, FrameCache, FrameSampler, frame_paths, image_tokens
+
+
+def synthetic_video(out_dir, shots, frames_per_shot, size=(1280, 720), seed=0):
+    """
+    Writes frame_00000.jpg, ... to out_dir; returns the frame paths in order.
+    """
+    rng = np.random.default_rng(seed)
+    width, height = size
+    paths = []
+    for shot in range(shots):
+        top, bottom = rng.integers(0, 256, 3), rng.integers(0, 256, 3)
+        ramp = np.linspace(0.0, 1.0, height)[:, None, None]
+        background = (top * (1 - ramp) + bottom * ramp).repeat(width, axis=1)
+        figures = [(rng.integers(100, width - 300), rng.integers(100, height - 400), tuple(rng.integers(0, 256, 3).tolist())) for _ in range(2)]
+        for step in range(frames_per_shot):
+            noisy = np.clip(background + rng.normal(0, 4, background.shape), 0, 255).astype(np.uint8)
+            image = Image.fromarray(noisy, "RGB")
+            draw = ImageDraw.Draw(image)
+            for i, (x, y, colour) in enumerate(figures):
+                # figures drift a few pixels per frame, as people do within one shot
+                x += step * (2 if i else -1)
+                draw.ellipse((x + 40, y, x + 160, y + 120), fill=colour)
+                draw.rectangle((x, y + 130, x + 200, y + 380), fill=colour)
+            path = Path(out_dir) / f"frame_{len(paths):05d}.jpg"
+            image.save(path, quality=90)
+            paths.append(path)
+    return paths
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--shots", type=int, default=6)
+    parser.add_argument("--frames-per-shot", type=int, default=40)
+    parser.add_argument("--max-frames", type=int, default=DEFAULT_MAX_FRAMES)
+    parser.add_argument("--out", type=str, default=None, help="Keep the generated frames in this directory")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out = Path(args.out) if args.out else Path(tmp) / "frames"
+        out.mkdir(parents=True, exist_ok=True)
+        paths = synthetic_video(out, args.shots, args.frames_per_shot)
+        width, height = Image.open(paths[0]).size
+        naive_tokens = len(paths) * image_tokens(width, height, "high")
+        naive_bytes = sum(path.stat().st_size for path in paths)
+        print(f"{len(paths)} frames ({args.shots} shots) at {width}x{height}")
+        print(f"{'setting':<28}{'frames':>8}{'image tokens':>14}{'KB sent':>10}{'cold ms':>10}{'warm ms':>10}")
+        print(f"{'every frame, high detail':<28}{len(paths):>8}{naive_tokens:>14}{naive_bytes / 1024:>10.0f}{'-':>10}{'-':>10}")
+
+        for detail, side in (("low", 512), ("high", 768)):
+            cache = FrameCache(Path(tmp) / f"frames_{detail}.db")
+            sampler = FrameSampler(max_frames=args.max_frames, max_side=side, detail=detail, cache=cache)
+            start = time.perf_counter()
+            cold = sampler.prepare(frame_paths(out))
+            cold_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            warm = sampler.prepare(frame_paths(out))
+            warm_ms = (time.perf_counter() - start) * 1000
+            assert [frame.digest for frame in cold] == [frame.digest for frame in warm]
+            tokens = sum(frame.tokens for frame in cold)
+            sent = sum(len(frame.data) for frame in cold)
+            label = f"keyframes, {detail} ({side}px)"
+            print(f"{label:<28}{len(cold):>8}{tokens:>14}{sent / 1024:>10.0f}{cold_ms:>10.0f}{warm_ms:>10.0f}")
+            cache.close()
+
+
+if __name__ == "__main__":
+    main()
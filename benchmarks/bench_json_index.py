@@ -0,0 +1,84 @@
+"""
+Latency of a --json-path/--equals lookup as a full json_extract scan vs. through the
+indexed generated column that db.init_db materialises for hot paths.
+
+    python benchmarks/bench_json_index.py --rows 200000
+"""
+import argparse
+import json
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db import SceneWriter, indexed_paths
+
+SAMPLE = json.loads((Path(__file__).resolve().parent.parent / "output.json").read_text())
+JUDGMENTS = ["Adherence", "Violation", "Ambiguous"]
+STAKES = [
+    "Low Stakes (Social / Recreational)",
+    "Medium Stakes (Reputation / Mild Conflict)",
+    "High Stakes (Career / Safety / Legal / Life)",
+]
+QUERY = """
+    SELECT scene_id, data_json FROM scenes
+    WHERE {target} = ?
+    ORDER BY scene_id
+    LIMIT ?
+"""
+
+
+def populate(db_path: Path, rows: int) -> None:
+    rng = random.Random(0)
+    with SceneWriter(db_path, batch_size=5000) as writer:
+        for i in range(rows):
+            result = dict(SAMPLE)
+            result["stakes_level"] = rng.choice(STAKES)
+            # "Violation" is rare, which is the case the index helps most
+            judgment = "Violation" if rng.random() < 0.001 else rng.choice(JUDGMENTS[::2])
+            result["verdict"] = {"judgment": judgment, "violations": None}
+            writer.put(result, scene_id=f"S{i:08d}")
+
+
+def timed(conn: sqlite3.Connection, sql: str, params: tuple, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--limit", type=int, default=25)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        populate(db_path, args.rows)
+        conn = sqlite3.connect(str(db_path))
+        columns = indexed_paths(conn)
+
+        print(f"{args.rows} rows, LIMIT {args.limit}")
+        print(f"{'path = value':<52}{'scan ms':>10}{'indexed ms':>12}")
+        for path, value in (("$.verdict.judgment", "Violation"), ("$.stakes_level", STAKES[2])):
+            scan = timed(
+                conn,
+                QUERY.format(target="json_extract(data_json, ?)"),
+                (path, value, args.limit),
+                args.repeat,
+            )
+            indexed = timed(conn, QUERY.format(target=columns[path]), (value, args.limit), args.repeat)
+            print(f"{path + ' = ' + value[:20]:<52}{scan:>10.2f}{indexed:>12.2f}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
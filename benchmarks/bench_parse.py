@@ -0,0 +1,66 @@
+"""
+Per-response parsing cost: LangChain's PydanticOutputParser + .dict() (the previous
+extraction_chain path) vs. parse_response (cached TypeAdapter.validate_json).
+
+    python benchmarks/bench_parse.py --iterations 500
+"""
+import argparse
+import json
+import sys
+import timeit
+import warnings
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langchain_core.output_parsers import PydanticOutputParser
+
+from benchmarks.samples import sample_result
+from extraction_chain.data_models import ComprehensionLayer, PerceptionLayer, SocialNormativeContext
+from extraction_chain.parsing import parse_response
+
+RECORDED = Path(__file__).resolve().parent.parent / "output.json"
+
+
+def responses(data_model):
+    """
+    Model-style completions: a fenced block (the common case) and bare JSON.
+    """
+    if data_model is SocialNormativeContext:
+        body = RECORDED.read_text()
+    else:
+        body = json.dumps(sample_result(data_model), indent=2)
+    return [f"```json\n{body}\n```", body]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+    # the baseline deliberately uses the deprecated .dict()
+    warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+    print(f"{'model':<24}{'langchain us/call':>19}{'fast path us/call':>19}{'speedup':>10}")
+    for data_model in (SocialNormativeContext, PerceptionLayer, ComprehensionLayer):
+        output_parser = PydanticOutputParser(pydantic_object=data_model)
+        texts = responses(data_model)
+        for text in texts:
+            old = json.loads(json.dumps(output_parser.invoke(text).dict(), default=lambda e: e.value))
+            assert parse_response(text, data_model, output_parser) == old
+
+        def slow():
+            for text in texts:
+                output_parser.invoke(text).dict()
+
+        def fast():
+            for text in texts:
+                parse_response(text, data_model, output_parser)
+
+        n = args.iterations
+        per_slow = timeit.timeit(slow, number=n) / (n * len(texts)) * 1e6
+        per_fast = timeit.timeit(fast, number=n) / (n * len(texts)) * 1e6
+        print(f"{data_model.__name__:<24}{per_slow:>19.1f}{per_fast:>19.1f}{per_slow / per_fast:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
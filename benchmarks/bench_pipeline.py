@@ -0,0 +1,92 @@
+"""
+End-to-end scenes/sec of the batch pipeline (render -> model call -> parse/validate ->
+SceneWriter) with the model replaced by a ReplayClient, plus p50/p95 per stage.
+
+With the default --latency 0 this measures the CPU-side cost of everything except
+the model; raise it to see how concurrency hides network time.
+
+    python benchmarks/bench_pipeline.py --scenes 500 --concurrency 32 --latency 0
+"""
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from batch import run_batch
+from benchmarks.samples import sample_result
+from extraction_chain import instrumentation
+from extraction_chain.data_models import ComprehensionLayer, PerceptionLayer, SocialNormativeContext
+from extraction_chain.extraction_chain import compile_chain
+from extraction_chain.image_perception import set_client
+from extraction_chain.prompt_template import prompt_template, structured_prompt_template
+from extraction_chain.replay import ReplayClient, fixture_entry, write_fixture
+
+MODEL = "gpt-4o"
+STAGES = ("render", "request", "parse", "db_batch")
+
+
+def synthetic_fixture(path, data_model, template, structured, count):
+    """
+    Writes one schema-valid recorded response per synthetic scene; returns the scenes.
+    """
+    chain = compile_chain(data_model, template, structured)
+    scenes = []
+    entries = []
+    for i in range(count):
+        text = f"Scene {i}: two colleagues meet at the coffee machine; one ignores the other's greeting."
+        content = "```json\n" + json.dumps(sample_result(data_model, i), indent=2) + "\n```"
+        scenes.append({"scene_id": f"S{i:06d}", "text": text})
+        entries.append(fixture_entry(chain.messages(text), MODEL, content))
+    write_fixture(path, entries)
+    return scenes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenes", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.0, help="Synthetic seconds per model call")
+    parser.add_argument("--structured", action="store_true", help="Use the structured-output prompt")
+    args = parser.parse_args()
+    template = structured_prompt_template if args.structured else prompt_template
+
+    header = f"{'model':<24}{'scenes/s':>10}" + "".join(f"{stage + ' p50/p95 ms':>24}" for stage in STAGES)
+    print(header)
+    for data_model in (SocialNormativeContext, PerceptionLayer, ComprehensionLayer):
+        with tempfile.TemporaryDirectory() as tmp:
+            fixture = Path(tmp) / "fixture.jsonl"
+            scenes = synthetic_fixture(fixture, data_model, template, args.structured, args.scenes)
+            set_client(ReplayClient(fixture, latency=args.latency))
+            profiler = instrumentation.enable()
+            start = time.perf_counter()
+            stats = asyncio.run(
+                run_batch(
+                    scenes,
+                    data_model=data_model,
+                    prompt_template=template,
+                    reasoning_model=MODEL,
+                    concurrency=args.concurrency,
+                    db_path=Path(tmp) / "bench.db",
+                    structured=args.structured,
+                )
+            )
+            elapsed = time.perf_counter() - start
+            instrumentation.disable()
+        if stats["failed"]:
+            raise SystemExit(f"{data_model.__name__}: {stats['failed']} scenes failed")
+
+        summary = profiler.summary()["stages"]
+        cells = []
+        for stage in STAGES:
+            item = summary.get(stage)
+            cells.append(f"{item['p50_ms']:.3f}/{item['p95_ms']:.3f}" if item else "-")
+        print(f"{data_model.__name__:<24}{args.scenes / elapsed:>10.0f}" + "".join(f"{cell:>24}" for cell in cells))
+
+
+if __name__ == "__main__":
+    main()
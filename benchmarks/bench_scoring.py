@@ -0,0 +1,135 @@
+"""
+Scoring cost for every enum field of a model: a pure-Python loop over result dicts
+(accuracy and confusion counts per field) vs. scoring.score on integer-coded arrays,
+which also computes macro-F1 and bootstrap intervals. Loading the labels is timed
+too: scoring.load_sqlite on a scenes table and scoring.load_jsonl on the same rows,
+written to a temporary directory first.
+
+    python benchmarks/bench_scoring.py --scenes 1000000 --python-scenes 100000 --load-scenes 200000
+"""
+import argparse
+import json
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from extraction_chain.data_models import ComprehensionLayer, SocialNormativeContext
+from extraction_chain.enum_codes import enum_fields
+from scoring import Labels, load_jsonl, load_sqlite, scalar_paths, score
+
+
+def synthetic_labels(data_model, scenes, agreement, seed):
+    rng = np.random.default_rng(seed)
+    fields = scalar_paths(enum_fields(data_model))
+    scene_ids = np.array([f"S{i:08d}" for i in range(scenes)], dtype=object)
+    gold = {path: rng.integers(0, len(enum) + 1, scenes).astype(np.int16) for path, enum in fields.items()}
+    predicted = {
+        path: np.where(rng.random(scenes) < agreement, codes, rng.integers(0, len(fields[path]) + 1, scenes)).astype(
+            np.int16
+        )
+        for path, codes in gold.items()
+    }
+    return fields, Labels(scene_ids, gold), Labels(scene_ids.copy(), predicted)
+
+
+def python_baseline(fields, gold, predicted, scenes):
+    """
+    The dict-per-scene approach: rebuild nested-path values and count field by field.
+    """
+    values = {path: [member.value for member in enum] + [None] for path, enum in fields.items()}
+    gold_rows = [{path: values[path][gold.columns[path][i]] for path in fields} for i in range(scenes)]
+    pred_rows = [{path: values[path][predicted.columns[path][i]] for path in fields} for i in range(scenes)]
+    start = time.perf_counter()
+    for path in fields:
+        correct = 0
+        confusion = Counter()
+        for gold_row, pred_row in zip(gold_rows, pred_rows):
+            correct += gold_row[path] == pred_row[path]
+            confusion[(gold_row[path], pred_row[path])] += 1
+    return time.perf_counter() - start
+
+
+def write_results(labels, fields, scenes, out_dir):
+    """
+    The first `scenes` rows of labels as stored results (enum fields only), in a
+    SQLite scenes table and in a JSONL file; returns both paths.
+    """
+    values = {path: [member.value for member in enum] + [None] for path, enum in fields.items()}
+    parts = {path: path.split(".") for path in fields}
+    rows = []
+    for i in range(scenes):
+        result = {}
+        for path, keys in parts.items():
+            value = values[path][labels.columns[path][i]]
+            if value is None:
+                continue
+            node = result
+            for key in keys[:-1]:
+                node = node.setdefault(key, {})
+            node[keys[-1]] = value
+        rows.append((str(labels.scene_ids[i]), json.dumps(result)))
+
+    db_path = Path(out_dir) / "scores.db"
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("CREATE TABLE scenes (scene_id TEXT PRIMARY KEY, data_json TEXT NOT NULL)")
+    conn.executemany("INSERT INTO scenes VALUES (?, ?)", rows)
+    conn.commit()
+    conn.close()
+    jsonl_path = Path(out_dir) / "scores.jsonl"
+    with open(jsonl_path, "w", encoding="utf-8") as f:
+        for scene_id, data_json in rows:
+            f.write(f'{{"scene_id": "{scene_id}", "data_json": {data_json}}}\n')
+    return db_path, jsonl_path
+
+
+def timed_load(loader, path, data_model, scenes):
+    start = time.perf_counter()
+    labels = loader(path, data_model)
+    elapsed = time.perf_counter() - start
+    assert len(labels) == scenes
+    return elapsed * 1_000_000 / scenes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenes", type=int, default=1_000_000)
+    parser.add_argument("--python-scenes", type=int, default=100_000, help="Scenes for the (slow) baseline")
+    parser.add_argument("--bootstrap", type=int, default=1000)
+    parser.add_argument(
+        "--load-scenes", type=int, default=200_000, help="Rows written to SQLite/JSONL for the load timings"
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'model':<24}{'fields':>8}{'python s/1M':>14}{'numpy s/1M':>13}{'speedup':>10}"
+        f"{'sqlite load s/1M':>19}{'jsonl load s/1M':>18}"
+    )
+    for data_model in (SocialNormativeContext, ComprehensionLayer):
+        fields, gold, predicted = synthetic_labels(data_model, args.scenes, 0.8, seed=1)
+        start = time.perf_counter()
+        score(gold, predicted, data_model, bootstrap=args.bootstrap)
+        vectorised = (time.perf_counter() - start) * 1_000_000 / args.scenes
+
+        small = min(args.python_scenes, args.scenes)
+        baseline = python_baseline(fields, gold, predicted, small) * 1_000_000 / small
+
+        rows = min(args.load_scenes, args.scenes)
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path, jsonl_path = write_results(gold, fields, rows, tmp)
+            sqlite_load = timed_load(load_sqlite, db_path, data_model, rows)
+            jsonl_load = timed_load(load_jsonl, jsonl_path, data_model, rows)
+        print(
+            f"{data_model.__name__:<24}{len(fields):>8}{baseline:>14.2f}{vectorised:>13.2f}{baseline / vectorised:>9.1f}x"
+            f"{sqlite_load:>19.2f}{jsonl_load:>18.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Cold-start latency of the CLI entry points (`--help`, which exits right after argument
+parsing), plus the slowest imports reported by `python -X importtime`.
+
+    python benchmarks/bench_startup.py --runs 10 --top 8
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+ENTRY_POINTS = ("main.py", "db_query.py")
+
+
+def wall_times(script: str, runs: int) -> List[float]:
+    # no OPENAI_API_KEY on purpose: startup must not depend on it
+    env = {key: value for key, value in os.environ.items() if key != "OPENAI_API_KEY"}
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, script, "--help"],
+            cwd=ROOT,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            check=True,
+        )
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def slowest_imports(script: str, top: int) -> List[Tuple[int, str]]:
+    """
+    (cumulative microseconds, module) for the `top` top-level imports of the script.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", script, "--help"],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # nesting depth is encoded as two extra spaces per level; keep top-level imports only
+        if not name.startswith("  "):
+            entries.append((int(cumulative), name.strip()))
+    return sorted(entries, reverse=True)[:top]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=8)
+    args = parser.parse_args()
+
+    for script in ENTRY_POINTS:
+        times = wall_times(script, args.runs)
+        print(
+            f"{script} --help: median {statistics.median(times):.0f} ms, "
+            f"min {min(times):.0f} ms over {args.runs} runs"
+        )
+        for cumulative, name in slowest_imports(script, args.top):
+            print(f"    {cumulative / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
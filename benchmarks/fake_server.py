@@ -0,0 +1,269 @@
+"""
+Minimal local stand-in for the OpenAI chat-completions endpoint.
+
+Every POST to /v1/chat/completions answers with the same canned JSON body, so
+the batch runner can be exercised end-to-end without an API key:
+
+    python benchmarks/fake_server.py --response output.json --latency 0.5 &
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake \
+        python main.py --input scenes.jsonl --concurrency 32
+
+Usage mimics provider-side prompt caching: once a system message of at least 1024
+(estimated) tokens has been seen, later requests starting with it report that prefix,
+rounded down to 128 tokens, as usage.prompt_tokens_details.cached_tokens.
+
+With --error-rate, that fraction of requests fails instead, alternating between
+429 (with a Retry-After header) and 503, to exercise the client's retry path.
+
+Requests with "stream": true are answered as server-sent events, the content split
+into STREAM_CHUNK_CHARS deltas with --latency spread evenly over them. With
+--invalid-rate, that fraction of answers replaces the value of --invalid-field with a
+string no enum accepts, to exercise validation, streamed aborts and repairs.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+DEFAULT_RESPONSE = Path(__file__).resolve().parent.parent / "output.json"
+
+
+CACHE_MIN_TOKENS = 1024
+CACHE_BLOCK_TOKENS = 128
+STREAM_CHUNK_CHARS = 16
+INVALID_VALUE = "Not A Valid Value"
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def usage_body(request: dict, content: str, seen_prefixes: set) -> dict:
+    messages = request.get("messages") or [{}]
+    prompt_tokens = sum(estimate_tokens(str(message.get("content", ""))) for message in messages)
+    cached_tokens = 0
+    first = messages[0]
+    if first.get("role") == "system":
+        prefix_tokens = estimate_tokens(first.get("content", ""))
+        if prefix_tokens >= CACHE_MIN_TOKENS:
+            key = hash(first["content"])
+            if key in seen_prefixes:
+                cached_tokens = prefix_tokens - prefix_tokens % CACHE_BLOCK_TOKENS
+            seen_prefixes.add(key)
+    completion_tokens = estimate_tokens(content)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached_tokens},
+    }
+
+
+def completion_body(content: str, model: str, usage: dict = None, n: int = 1) -> dict:
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": index,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+            for index in range(n)
+        ],
+        "usage": usage or {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+def chunk_body(model: str, delta: dict = None, finish_reason: str = None, usage: dict = None) -> dict:
+    choices = [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": choices,
+        "usage": usage,
+    }
+
+
+def corrupt(content: str, field: str) -> str:
+    """
+    content with the top-level `field` set to INVALID_VALUE (unchanged if it is not a JSON object).
+    """
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return content
+    if not isinstance(data, dict):
+        return content
+    data[field] = INVALID_VALUE
+    return json.dumps(data, indent=4)
+
+
+def make_handler(
+    content: str,
+    latency: float,
+    error_rate: float = 0.0,
+    retry_after: float = 1.0,
+    invalid_rate: float = 0.0,
+    invalid_field: str = "topology",
+):
+    invalid_content = corrupt(content, invalid_field)
+
+    class Handler(BaseHTTPRequestHandler):
+        requests_served = 0
+        errors_served = 0
+        streams_aborted = 0
+        seen_prefixes = set()
+        lock = threading.Lock()
+
+        def do_POST(self) -> None:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            with Handler.lock:
+                Handler.requests_served += 1
+                fail = random.random() < error_rate
+                if fail:
+                    Handler.errors_served += 1
+                    rate_limited = Handler.errors_served % 2 == 1
+                else:
+                    answer = invalid_content if random.random() < invalid_rate else content
+                    usage = usage_body(request, answer, Handler.seen_prefixes)
+            if fail:
+                if rate_limited:
+                    error = {"message": "Rate limit reached", "type": "rate_limit_exceeded"}
+                    self.send_json(429, {"error": error}, {"Retry-After": str(retry_after)})
+                else:
+                    error = {"message": "Service unavailable", "type": "server_error"}
+                    self.send_json(503, {"error": error})
+                return
+            model = request.get("model", "fake")
+            if request.get("stream"):
+                include_usage = (request.get("stream_options") or {}).get("include_usage")
+                self.send_stream(answer, model, usage if include_usage else None)
+                return
+            if latency:
+                time.sleep(latency)
+            headers = {"openai-processing-ms": str(int(latency * 1000))}
+            self.send_json(200, completion_body(answer, model, usage, request.get("n") or 1), headers)
+
+        def send_stream(self, answer: str, model: str, usage: dict = None) -> None:
+            deltas = [answer[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(answer), STREAM_CHUNK_CHARS)]
+            events = [chunk_body(model, {"role": "assistant", "content": ""})]
+            events += [chunk_body(model, {"content": delta}) for delta in deltas]
+            events.append(chunk_body(model, {}, finish_reason="stop"))
+            if usage is not None:
+                events.append(chunk_body(model, usage=usage))
+            wait = latency / max(1, len(deltas))
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            try:
+                for event in events:
+                    if wait and event["choices"] and event["choices"][0]["delta"].get("content"):
+                        time.sleep(wait)
+                    self.wfile.write(b"data: " + json.dumps(event).encode() + b"\n\n")
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+            except (BrokenPipeError, ConnectionResetError):
+                with Handler.lock:
+                    Handler.streams_aborted += 1
+
+        def send_json(self, status: int, payload: dict, headers: dict = None) -> None:
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args) -> None:
+            pass
+
+    return Handler
+
+
+def serve(
+    host: str,
+    port: int,
+    content: str,
+    latency: float = 0.0,
+    error_rate: float = 0.0,
+    retry_after: float = 1.0,
+    invalid_rate: float = 0.0,
+    invalid_field: str = "topology",
+) -> ThreadingHTTPServer:
+    """
+    Starts the server on a background thread and returns it (call .shutdown() to stop).
+    Pass port=0 to pick a free port; the bound port is server.server_address[1].
+    """
+    server = ThreadingHTTPServer(
+        (host, port), make_handler(content, latency, error_rate, retry_after, invalid_rate, invalid_field)
+    )
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve canned chat completions for local testing.")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--response",
+        type=str,
+        default=str(DEFAULT_RESPONSE),
+        help="File whose contents are returned as the assistant message",
+    )
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering")
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of requests answered with 429/503 instead of a completion",
+    )
+    parser.add_argument(
+        "--retry-after",
+        type=float,
+        default=1.0,
+        help="Retry-After seconds sent with 429 responses",
+    )
+    parser.add_argument(
+        "--invalid-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of answers with an invalid value in --invalid-field",
+    )
+    parser.add_argument("--invalid-field", type=str, default="topology", help="Top-level field to corrupt")
+    args = parser.parse_args()
+
+    content = Path(args.response).read_text()
+    server = serve(
+        args.host,
+        args.port,
+        content,
+        args.latency,
+        args.error_rate,
+        args.retry_after,
+        args.invalid_rate,
+        args.invalid_field,
+    )
+    print(f"Serving fake completions on http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+Deterministic, schema-valid example results for benchmarks that have no recorded
+model output at hand.
+"""
+import typing
+from enum import Enum
+from typing import Any, Dict
+
+from pydantic import BaseModel
+
+
+def sample_value(annotation: Any, variant: int) -> Any:
+    origin = typing.get_origin(annotation)
+    if origin is typing.Union:
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        return sample_value(args[0], variant)
+    if origin is list:
+        return [sample_value(typing.get_args(annotation)[0], variant + i) for i in range(3)]
+    if isinstance(annotation, type) and issubclass(annotation, Enum):
+        members = list(annotation)
+        return members[variant % len(members)].value
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return sample_result(annotation, variant)
+    if annotation is bool:
+        return variant % 2 == 0
+    return f"Sample free-text explanation number {variant} describing what the agents do and why."
+
+
+def sample_result(data_model: type, variant: int = 0) -> Dict[str, Any]:
+    return {
+        name: sample_value(field.annotation, variant + i)
+        for i, (name, field) in enumerate(data_model.model_fields.items())
+    }
@@ -1,10 +1,119 @@
-import json
+import queue
+import re
 import sqlite3
+import threading
 from pathlib import Path
-from typing import Any, Dict, Optional, Union
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Type, Union
+
+import orjson
+
+from extraction_chain.instrumentation import stage
+
+if TYPE_CHECKING:
+    from extraction_chain.versioning import SchemaVersion
 
 DEFAULT_DB_PATH = Path(__file__).resolve().parent / "eqbench.db"
 
+# Hot JSON paths materialised as indexed generated columns on every database.
+# Declare more per database with `db_query.py --index-path PATH`.
+DEFAULT_INDEXED_PATHS = (
+    "$.verdict.judgment",
+    "$.stakes_level",
+    "$.comprehension_layer.emotional_state.felt_emotion",
+)
+STORAGE_FORMATS = ("json", "coded")
+JSON_PATH_RE = re.compile(r"^\$(\.[A-Za-z_][A-Za-z0-9_]*|\[[0-9]+\])+$")
+
+UPSERT_SCENE_SQL = """
+    INSERT INTO scenes (scene_id, data_json, schema_hash, layer_hashes)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(scene_id) DO UPDATE SET
+        data_json = excluded.data_json,
+        schema_hash = excluded.schema_hash,
+        layer_hashes = excluded.layer_hashes,
+        updated_at = datetime('now')
+"""
+
+# schema version of each row (see extraction_chain/versioning.py); added to older databases by init_db
+VERSION_COLUMNS = ("schema_hash", "layer_hashes")
+
+
+# Free-text result fields mirrored into the scenes_fts full-text index. Matched by key
+# anywhere in the result, so they are found whatever layer or combined model wrote it.
+FTS_FIELDS = (
+    "trigger_event",
+    "intent_causal_reasoning",
+    "relationship_change_trigger",
+    "explanation",
+)
+
+
+FTS_TABLE = "scenes_fts"
+
+
+def _fts_insert_sql(row: str, source: str = "", group_by: str = "") -> str:
+    """
+    INSERT into the FTS index from one json_tree pass over each document, aggregating
+    every occurrence of each field. `row` is NEW inside triggers; the backfill reads
+    the scenes table itself.
+    """
+    columns = ", ".join(f"group_concat(t.value, ' ') FILTER (WHERE t.key = '{field}')" for field in FTS_FIELDS)
+    return f"""
+        INSERT INTO {FTS_TABLE} (rowid, scene_id, {", ".join(FTS_FIELDS)})
+        SELECT {row}.rowid, {row}.scene_id, {columns}
+        FROM {source}json_tree({row}.data_json) AS t
+        WHERE t.type = 'text' {group_by}
+    """
+
+
+def init_fts(conn: sqlite3.Connection) -> bool:
+    """
+    Creates the scenes_fts FTS5 index over FTS_FIELDS and the triggers that keep it in
+    step with every insert, upsert and delete on scenes. An existing scenes table is
+    indexed once, on creation. Returns False (and does nothing) when this SQLite build
+    has no FTS5.
+    """
+    if _has_table(conn, FTS_TABLE):
+        return True
+    try:
+        conn.execute(
+            f"""
+            CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+                scene_id UNINDEXED, {", ".join(FTS_FIELDS)},
+                tokenize = 'porter unicode61'
+            )
+            """
+        )
+    except sqlite3.OperationalError as exc:
+        if "fts5" in str(exc):
+            return False
+        raise
+    insert_new = _fts_insert_sql("new")
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS scenes_fts_insert AFTER INSERT ON scenes BEGIN
+            {insert_new};
+        END
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS scenes_fts_update AFTER UPDATE OF data_json ON scenes BEGIN
+            DELETE FROM {FTS_TABLE} WHERE rowid = old.rowid;
+            {insert_new};
+        END
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS scenes_fts_delete AFTER DELETE ON scenes BEGIN
+            DELETE FROM {FTS_TABLE} WHERE rowid = old.rowid;
+        END
+        """
+    )
+    conn.execute(_fts_insert_sql("scenes", source="scenes, ", group_by="GROUP BY scenes.rowid"))
+    return True
+
 
 def init_db(conn: sqlite3.Connection) -> None:
     conn.execute(
@@ -13,34 +122,600 @@ def init_db(conn: sqlite3.Connection) -> None:
             scene_id TEXT PRIMARY KEY,
             data_json TEXT NOT NULL,
             created_at TEXT NOT NULL DEFAULT (datetime('now')),
+            updated_at TEXT NOT NULL DEFAULT (datetime('now')),
+            schema_hash TEXT,
+            layer_hashes TEXT
+        );
+        """
+    )
+    columns = {row[1] for row in conn.execute("PRAGMA table_xinfo(scenes)")}
+    for column in VERSION_COLUMNS:
+        if column not in columns:
+            conn.execute(f"ALTER TABLE scenes ADD COLUMN {column} TEXT")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS json_path_indexes (
+            path TEXT PRIMARY KEY,
+            column_name TEXT NOT NULL UNIQUE
+        );
+        """
+    )
+    existing = indexed_paths(conn)
+    for path in DEFAULT_INDEXED_PATHS:
+        if path not in existing:
+            ensure_path_index(conn, path)
+    init_fts(conn)
+
+
+def path_column(path: str) -> str:
+    """
+    Generated-column name for a JSON path ($.verdict.judgment -> jp_verdict_judgment).
+    """
+    return "jp_" + re.sub(r"[^A-Za-z0-9]+", "_", path[1:]).strip("_")
+
+
+def indexed_paths(conn: sqlite3.Connection) -> Dict[str, str]:
+    """
+    Maps each declared JSON path to its generated column. Empty if the DB predates indexing.
+    """
+    try:
+        return dict(conn.execute("SELECT path, column_name FROM json_path_indexes"))
+    except sqlite3.OperationalError:
+        return {}
+
+
+def ensure_path_index(conn: sqlite3.Connection, path: str) -> str:
+    """
+    Materialises json_extract(data_json, path) as a VIRTUAL generated column with an
+    index, and records it in json_path_indexes. Safe to call repeatedly; works on
+    existing databases (the index build scans the table once).
+    """
+    if not JSON_PATH_RE.match(path):
+        raise ValueError(f"Unsupported JSON path: {path!r} (expected e.g. $.verdict.judgment)")
+    column = indexed_paths(conn).get(path)
+    if column is not None:
+        return column
+
+    column = path_column(path)
+    columns = {row[1] for row in conn.execute("PRAGMA table_xinfo(scenes)")}
+    if column not in columns:
+        # the path is validated above, so inlining it as a literal is safe
+        conn.execute(
+            f"ALTER TABLE scenes ADD COLUMN {column} "
+            f"GENERATED ALWAYS AS (json_extract(data_json, '{path}')) VIRTUAL"
+        )
+    # (column, scene_id) so `WHERE column = ? ORDER BY scene_id LIMIT n` needs no sort
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_scenes_{column} ON scenes ({column}, scene_id)")
+    conn.execute(
+        "INSERT OR REPLACE INTO json_path_indexes (path, column_name) VALUES (?, ?)",
+        (path, column),
+    )
+    return column
+
+
+def migrate_db(
+    db_path: Union[str, Path] = DEFAULT_DB_PATH,
+    paths: Iterable[str] = (),
+) -> Dict[str, str]:
+    """
+    Brings an existing database up to date (default indexed paths plus any extra `paths`)
+    and returns the full path -> column mapping.
+    """
+    with sqlite3.connect(str(db_path)) as conn:
+        init_db(conn)
+        for path in paths:
+            ensure_path_index(conn, path)
+        return indexed_paths(conn)
+
+
+JOB_STATUSES = ("running", "done", "failed")
+
+START_JOB_SQL = """
+    INSERT INTO jobs (scene_id, status, attempts, started_at)
+    VALUES (?, 'running', 1, ?)
+    ON CONFLICT(scene_id) DO UPDATE SET
+        status = 'running',
+        attempts = attempts + 1,
+        last_error = NULL,
+        started_at = excluded.started_at,
+        finished_at = NULL,
+        duration_s = NULL,
+        updated_at = datetime('now')
+"""
+
+FINISH_JOB_SQL = """
+    UPDATE jobs SET
+        status = ?,
+        last_error = ?,
+        finished_at = ?,
+        duration_s = ? - started_at,
+        updated_at = datetime('now')
+    WHERE scene_id = ?
+"""
+
+
+def init_jobs(conn: sqlite3.Connection) -> None:
+    """
+    Per-scene state for corpus runs: running/done/failed, attempt count, the last error
+    and wall-clock timings (unix seconds). A scene left 'running' by a crash is retried.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            scene_id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            started_at REAL,
+            finished_at REAL,
+            duration_s REAL,
             updated_at TEXT NOT NULL DEFAULT (datetime('now'))
         );
         """
     )
+    conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
 
 
-def store_scene(
+def completed_scene_ids(db_path: Union[str, Path]) -> Set[str]:
+    """
+    scene_ids whose job finished successfully; empty if the database does not exist yet.
+    """
+    if not Path(db_path).exists():
+        return set()
+    with sqlite3.connect(str(db_path)) as conn:
+        init_jobs(conn)
+        return {row[0] for row in conn.execute("SELECT scene_id FROM jobs WHERE status = 'done'")}
+
+
+def configure_connection(conn: sqlite3.Connection) -> None:
+    """
+    Pragmas for a long-lived writer: WAL so readers never block the writer,
+    NORMAL sync (durable at checkpoints, safe against corruption), a 64 MB page cache
+    and a busy timeout so concurrent processes wait instead of failing.
+    """
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-65536")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA busy_timeout=30000")
+
+
+def scene_row(
     result: Dict[str, Any],
-    db_path: Union[str, Path] = DEFAULT_DB_PATH,
     scene_id: Optional[str] = None,
-) -> None:
+    version: Optional["SchemaVersion"] = None,
+) -> Tuple[Optional[str], ...]:
+    """
+    (scene_id, data_json, schema_hash, layer_hashes) for UPSERT_SCENE_SQL.
+    """
+    if scene_id is None:
+        scene_id = result.get("scene_id")
+    if not scene_id:
+        raise ValueError("scene_id is required (pass --scene-id or include it in the output)")
+
+    # orjson writes the same compact JSON as json.dumps(separators=(",", ":")), several
+    # times faster; non-ASCII text is stored as UTF-8 rather than \u escapes
+    data_json = orjson.dumps(result).decode()
+    if version is None:
+        return scene_id, data_json, None, None
+    return scene_id, data_json, version.schema_hash, version.layer_hashes_json()
+
+
+def layer_update_sql(layers: Sequence[str]) -> str:
+    """
+    UPDATE that replaces only `layers` (dotted paths) of a stored result, keeping the rest,
+    and sets its schema version. Parameters: (partial data_json, schema_hash,
+    layer_hashes, scene_id).
+    """
+    for layer in layers:
+        if not re.match(r"^[A-Za-z_]\w*(\.[A-Za-z_]\w*)*$", layer):
+            raise ValueError(f"invalid layer name: {layer!r}")
+    assignments = ", ".join(f"'$.{layer}', json_extract(?1, '$.{layer}')" for layer in layers)
+    return f"""
+        UPDATE scenes SET
+            data_json = json_set(data_json, {assignments}),
+            schema_hash = ?2,
+            layer_hashes = ?3,
+            updated_at = datetime('now')
+        WHERE scene_id = ?4
+    """
+
+
+def version_row(result: Dict[str, Any], scene_id: Optional[str], version: "SchemaVersion") -> Tuple[Any, ...]:
+    """
+    Row for layer_update_sql(version.layers).
+    """
+    scene_id, data_json, schema_hash, layer_hashes = scene_row(result, scene_id, version)
+    return data_json, schema_hash, layer_hashes, scene_id
+
+
+def stored_versions(db_path: Union[str, Path]) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+    """
+    scene_id -> (schema_hash, layer_hashes) for every row in scenes; rows written
+    before versioning have (None, None).
+    """
+    if not Path(db_path).exists():
+        return {}
+    with sqlite3.connect(str(db_path)) as conn:
+        init_db(conn)
+        return {row[0]: (row[1], row[2]) for row in conn.execute("SELECT scene_id, schema_hash, layer_hashes FROM scenes")}
+
+
+def coded_table_name(data_model: Type[Any]) -> str:
+    return "coded_" + re.sub(r"(?<!^)(?=[A-Z])", "_", data_model.__name__).lower()
+
+
+def init_coded_table(conn: sqlite3.Connection, data_model: Type[Any]) -> Tuple[str, List[str]]:
+    """
+    Creates the compact table for data_model: the result JSON with enum values replaced
+    by integer codes (data_coded), plus one INTEGER column per enum field for fast
+    filtering and GROUP BY. Also registers the model's enum values in the enum_codes
+    lookup table (see register_enum_codes) and fills the coded_columns registry that
+    maps each column back to its JSON path and enum.
+
+    Returns (upsert SQL, enum paths in column order).
+    """
+    # pydantic is only needed for the coded format, so keep plain `import db` light
+    from extraction_chain.enum_codes import enum_fields
+
+    table = coded_table_name(data_model)
+    fields = enum_fields(data_model)
+    # list-valued paths have no single code; they stay in data_coded only
+    paths = [path for path in fields if "[]" not in path]
+    columns = ["c_" + re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") for path in paths]
+
+    register_enum_codes(conn, set(fields.values()))
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS coded_columns (
+            table_name TEXT NOT NULL,
+            path TEXT NOT NULL,
+            column_name TEXT,
+            enum_name TEXT NOT NULL,
+            PRIMARY KEY (table_name, path)
+        ) WITHOUT ROWID;
+        """
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO coded_columns (table_name, path, column_name, enum_name) VALUES (?, ?, ?, ?)",
+        [
+            (table, path, column, fields[path].__name__)
+            for path, column in zip(paths, columns)
+        ]
+        + [(table, path, None, enum.__name__) for path, enum in fields.items() if "[]" in path],
+    )
+    column_defs = "".join(f",\n            {column} INTEGER" for column in columns)
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            scene_id TEXT PRIMARY KEY,
+            data_coded TEXT NOT NULL,
+            created_at TEXT NOT NULL DEFAULT (datetime('now')),
+            updated_at TEXT NOT NULL DEFAULT (datetime('now')){column_defs}
+        );
+        """
+    )
+    names = ", ".join(["scene_id", "data_coded"] + columns)
+    placeholders = ", ".join("?" * (len(columns) + 2))
+    updates = "".join(f",\n            {column} = excluded.{column}" for column in columns)
+    upsert = f"""
+        INSERT INTO {table} ({names})
+        VALUES ({placeholders})
+        ON CONFLICT(scene_id) DO UPDATE SET
+            data_coded = excluded.data_coded,
+            updated_at = datetime('now'){updates}
+    """
+    return upsert, paths
+
+
+def init_enum_codes(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS enum_codes (
+            enum_name TEXT NOT NULL,
+            code INTEGER NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (enum_name, code)
+        ) WITHOUT ROWID;
+        """
+    )
+
+
+# one statement, so concurrent writers cannot hand out the same code twice
+REGISTER_CODE_SQL = """
+    INSERT INTO enum_codes (enum_name, code, value)
+    SELECT ?1, (SELECT COALESCE(MAX(code) + 1, 0) FROM enum_codes WHERE enum_name = ?1), ?2
+    WHERE NOT EXISTS (SELECT 1 FROM enum_codes WHERE enum_name = ?1 AND value = ?2)
+"""
+
+
+def register_enum_codes(conn: sqlite3.Connection, enums: Iterable[Type[Any]]) -> None:
+    """
+    Gives every value of `enums` that the database has not seen yet the next free code
+    of its enum. Codes already stored are never changed, so rows written earlier keep
+    their labels when members are inserted, reordered or removed in data_type.py.
+    """
+    init_enum_codes(conn)
+    conn.executemany(
+        REGISTER_CODE_SQL,
+        [(enum.__name__, member.value) for enum in sorted(enums, key=lambda enum: enum.__name__) for member in enum],
+    )
+
+
+def stored_codes(conn: sqlite3.Connection) -> Dict[str, Dict[str, int]]:
+    """
+    {enum name: {value: code}} from the enum_codes table.
+    """
+    codes: Dict[str, Dict[str, int]] = {}
+    if not _has_table(conn, "enum_codes"):
+        return codes
+    for enum_name, code, value in conn.execute("SELECT enum_name, code, value FROM enum_codes"):
+        codes.setdefault(enum_name, {})[value] = code
+    return codes
+
+
+def coded_row(
+    result: Dict[str, Any],
+    data_model: Type[Any],
+    paths: Sequence[str],
+    scene_id: Optional[str] = None,
+    codes: Optional[Dict[str, Dict[str, int]]] = None,
+) -> Tuple[Any, ...]:
+    """
+    Row for the upsert of init_coded_table. `codes` are the database's stored_codes.
+    """
+    from extraction_chain.enum_codes import encode
+
     if scene_id is None:
         scene_id = result.get("scene_id")
     if not scene_id:
         raise ValueError("scene_id is required (pass --scene-id or include it in the output)")
 
-    data_json = json.dumps(result, ensure_ascii=True, separators=(",", ":"))
+    coded = encode(result, data_model, codes)
+    codes = []
+    for path in paths:
+        node: Any = coded
+        for key in path.split("."):
+            node = node.get(key) if isinstance(node, dict) else None
+        codes.append(node if isinstance(node, int) else None)
+    data_coded = orjson.dumps(coded).decode()
+    return (scene_id, data_coded, *codes)
+
+
+def store_scene(
+    result: Dict[str, Any],
+    db_path: Union[str, Path] = DEFAULT_DB_PATH,
+    scene_id: Optional[str] = None,
+    data_model: Optional[Type[Any]] = None,
+    storage: str = "json",
+    version: Optional["SchemaVersion"] = None,
+) -> None:
+    """
+    storage="coded" writes the compact enum-coded format instead (requires data_model).
+    version: the SchemaVersion the result was extracted under, stored with the row
+    """
+    if storage not in STORAGE_FORMATS:
+        raise ValueError(f"storage must be one of {STORAGE_FORMATS}")
+    if storage == "coded" and data_model is None:
+        raise ValueError("coded storage needs the data_model the result was extracted with")
     db_path = str(db_path)
 
-    with sqlite3.connect(db_path) as conn:
+    with stage("db", storage=storage), sqlite3.connect(db_path) as conn:
+        if storage == "coded":
+            upsert, paths = init_coded_table(conn, data_model)
+            conn.execute(upsert, coded_row(result, data_model, paths, scene_id, stored_codes(conn)))
+            return
         init_db(conn)
-        conn.execute(
-            """
-            INSERT INTO scenes (scene_id, data_json)
-            VALUES (?, ?)
-            ON CONFLICT(scene_id) DO UPDATE SET
-                data_json = excluded.data_json,
-                updated_at = datetime('now')
-            """,
-            (scene_id, data_json),
-        )
+        if version is not None and version.layers:
+            conn.execute(layer_update_sql(version.layers), version_row(result, scene_id, version))
+        else:
+            conn.execute(UPSERT_SCENE_SQL, scene_row(result, scene_id, version))
+
+
+def coded_fields(conn: sqlite3.Connection) -> Dict[str, Dict[str, Dict[int, str]]]:
+    """
+    table_name -> {path: {code: value}} for every coded table in the database, with
+    the labels read from its enum_codes table (not from data_type.py, whose members
+    may have changed since the rows were written).
+    """
+    tables: Dict[str, Dict[str, Dict[int, str]]] = {}
+    try:
+        rows = conn.execute("SELECT table_name, path, enum_name FROM coded_columns").fetchall()
+    except sqlite3.OperationalError:
+        return tables
+    labels: Dict[str, Dict[int, str]] = {}
+    for enum_name, values in stored_codes(conn).items():
+        labels[enum_name] = {code: value for value, code in values.items()}
+    for table, path, enum_name in rows:
+        if enum_name not in labels:
+            raise ValueError(f"enum_codes has no codes for {enum_name} (used by {table}.{path})")
+        tables.setdefault(table, {})[path] = labels[enum_name]
+    return tables
+
+
+def load_scene(conn: sqlite3.Connection, scene_id: str) -> Optional[Dict[str, Any]]:
+    """
+    The stored result for scene_id as a dict, whichever storage format it was written in.
+    """
+    if _has_table(conn, "scenes"):
+        row = conn.execute("SELECT data_json FROM scenes WHERE scene_id = ?", (scene_id,)).fetchone()
+        if row:
+            return orjson.loads(row[0])
+    tables = coded_fields(conn)
+    if not tables:
+        return None
+
+    from extraction_chain.enum_codes import decode
+
+    for table, fields in tables.items():
+        row = conn.execute(f"SELECT data_coded FROM {table} WHERE scene_id = ?", (scene_id,)).fetchone()
+        if row:
+            return decode(orjson.loads(row[0]), fields)
+    return None
+
+
+def _has_table(conn: sqlite3.Connection, name: str) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
+
+
+class SceneWriter:
+    """
+    Long-lived writer for bulk ingestion. Any number of threads or asyncio tasks call
+    put(); a single background thread owns the connection and upserts queued rows in
+    transactions of up to batch_size rows (or whatever arrived within flush_interval).
+
+        with SceneWriter(db_path) as writer:
+            writer.put(result, scene_id="SCENE_001")
+
+    Pass storage="coded" and the data_model to write the compact enum-coded format.
+    start_job()/finish_job() go through the same queue; call finish_job after put so a
+    job is never marked done before its scene row is committed.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        db_path: Union[str, Path] = DEFAULT_DB_PATH,
+        batch_size: int = 500,
+        flush_interval: float = 0.5,
+        max_pending: int = 10_000,
+        data_model: Optional[Type[Any]] = None,
+        storage: str = "json",
+    ) -> None:
+        if storage not in STORAGE_FORMATS:
+            raise ValueError(f"storage must be one of {STORAGE_FORMATS}")
+        if storage == "coded" and data_model is None:
+            raise ValueError("coded storage needs the data_model the results are extracted with")
+        self.db_path = str(db_path)
+        self.data_model = data_model
+        self.storage = storage
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_pending)
+        self._error: Optional[BaseException] = None
+        self._closed = False
+
+        conn = sqlite3.connect(self.db_path)
+        configure_connection(conn)
+        self._codes: Dict[str, Dict[str, int]] = {}
+        if storage == "coded":
+            self._upsert_sql, self._paths = init_coded_table(conn, data_model)
+            self._codes = stored_codes(conn)
+        else:
+            init_db(conn)
+            self._upsert_sql, self._paths = UPSERT_SCENE_SQL, []
+        init_jobs(conn)
+        conn.commit()
+        conn.close()
+
+        self._thread = threading.Thread(target=self._run, name="scene-writer", daemon=True)
+        self._thread.start()
+
+    def put(
+        self,
+        result: Dict[str, Any],
+        scene_id: Optional[str] = None,
+        version: Optional["SchemaVersion"] = None,
+    ) -> None:
+        """
+        Queues one result. Serialisation happens here, in the producer, so the writer
+        thread only does SQLite work. Blocks if max_pending rows are already queued.
+
+        version: the SchemaVersion the result was extracted under; when it names
+        layers, only those layers of the stored row are replaced.
+        """
+        if self.storage == "coded":
+            self._enqueue(self._upsert_sql, coded_row(result, self.data_model, self._paths, scene_id, self._codes))
+        elif version is not None and version.layers:
+            self._enqueue(layer_update_sql(version.layers), version_row(result, scene_id, version))
+        else:
+            self._enqueue(self._upsert_sql, scene_row(result, scene_id, version))
+
+    def start_job(self, scene_id: str, started_at: float) -> None:
+        self._enqueue(START_JOB_SQL, (scene_id, started_at))
+
+    def finish_job(
+        self,
+        scene_id: str,
+        finished_at: float,
+        error: Optional[str] = None,
+    ) -> None:
+        status = "failed" if error else "done"
+        self._enqueue(FINISH_JOB_SQL, (status, error, finished_at, finished_at, scene_id))
+
+    def _enqueue(self, sql: str, row: Tuple[Any, ...]) -> None:
+        self._raise_if_failed()
+        if self._closed:
+            raise RuntimeError("SceneWriter is closed")
+        self._queue.put((sql, row))
+
+    def flush(self) -> None:
+        """
+        Blocks until every row queued so far has been committed.
+        """
+        self._queue.join()
+        self._raise_if_failed()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(self._STOP)
+        self._thread.join()
+        self._raise_if_failed()
+
+    def __enter__(self) -> "SceneWriter":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def _raise_if_failed(self) -> None:
+        if self._error is not None:
+            raise RuntimeError("SceneWriter failed") from self._error
+
+    def _run(self) -> None:
+        conn = sqlite3.connect(self.db_path)
+        configure_connection(conn)
+        try:
+            stopping = False
+            while not stopping:
+                batch: List[Tuple[str, Tuple[Any, ...]]] = []
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+                taken = 1
+                while True:
+                    if item is self._STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    taken += 1
+                try:
+                    if batch and self._error is None:
+                        with stage("db_batch", rows=len(batch)), conn:
+                            # executemany over each run of consecutive rows sharing a statement
+                            start = 0
+                            for end in range(1, len(batch) + 1):
+                                if end == len(batch) or batch[end][0] != batch[start][0]:
+                                    conn.executemany(batch[start][0], [row for _, row in batch[start:end]])
+                                    start = end
+                        self.written += sum(1 for sql, _ in batch if sql not in (START_JOB_SQL, FINISH_JOB_SQL))
+                except BaseException as exc:  # surfaced to producers on their next call
+                    self._error = exc
+                finally:
+                    for _ in range(taken):
+                        self._queue.task_done()
+        finally:
+            conn.close()
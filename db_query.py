@@ -3,10 +3,21 @@ from __future__ import annotations
 import argparse
 import json
 import sqlite3
+import sys
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List, Sequence, TextIO
 
-from db import DEFAULT_DB_PATH
+from db import (
+    DEFAULT_DB_PATH,
+    FTS_FIELDS,
+    FTS_TABLE,
+    JSON_PATH_RE,
+    coded_fields,
+    indexed_paths,
+    init_fts,
+    load_scene,
+    migrate_db,
+)
 
 
 def connect(db_path: str) -> sqlite3.Connection:
@@ -32,6 +43,130 @@ def print_rows(rows: List[sqlite3.Row]) -> None:
     print(json.dumps(payload, ensure_ascii=True, indent=2))
 
 
+def stream_ndjson(cursor: sqlite3.Cursor, out: TextIO = sys.stdout) -> int:
+    """
+    Writes one JSON object per row straight from the cursor, so memory stays flat
+    regardless of result size. data_json columns are already compact JSON (written by
+    db.store_scene / SceneWriter) and are spliced in verbatim rather than re-parsed;
+    a data_json value that is not an object or array is encoded as a string.
+    Returns the number of rows written.
+    """
+    names = [json.dumps(column[0]) for column in cursor.description]
+    raw = [column[0] == "data_json" for column in cursor.description]
+    count = 0
+    for row in cursor:
+        parts = []
+        for name, is_raw, value in zip(names, raw, row):
+            # a --sql alias may name any text data_json; only objects/arrays go in verbatim
+            if is_raw and isinstance(value, str) and value[:1] in ("{", "["):
+                encoded = value
+            else:
+                encoded = json.dumps(value, ensure_ascii=True)
+            parts.append(f"{name}:{encoded}")
+        out.write("{" + ",".join(parts) + "}\n")
+        count += 1
+    out.flush()
+    return count
+
+
+def emit(cursor: sqlite3.Cursor, ndjson: bool) -> None:
+    if ndjson:
+        stream_ndjson(cursor)
+    else:
+        print_rows(cursor.fetchall())
+
+
+def iter_stats(conn: sqlite3.Connection, paths: Sequence[str], table: str = "scenes") -> Iterator[Dict[str, Any]]:
+    """
+    Counts of each combination of values at `paths` (one path: a histogram, two: a
+    cross-tabulation), computed entirely in SQLite and yielded row by row.
+
+    On `scenes`, indexed paths use their generated column and others fall back to
+    json_extract. On a coded_<model> table the integer columns are grouped and joined
+    to enum_codes for the labels.
+    """
+    keys: List[str] = []
+    labels: List[str] = []
+    joins: List[str] = []
+    key_params: List[Any] = []
+    join_params: List[Any] = []
+    if table == "scenes":
+        columns = indexed_paths(conn)
+        for i, path in enumerate(paths):
+            if not JSON_PATH_RE.match(path):
+                raise SystemExit(f"Unsupported JSON path: {path!r} (expected e.g. $.verdict.judgment)")
+            if path in columns:
+                keys.append(f"t.{columns[path]} AS k{i}")
+            else:
+                keys.append(f"json_extract(t.data_json, ?) AS k{i}")
+                key_params.append(path)
+            labels.append(f"g.k{i}")
+    else:
+        if table not in coded_fields(conn):
+            raise SystemExit(f"Unknown table: {table}")
+        for i, path in enumerate(paths):
+            row = conn.execute(
+                "SELECT column_name, enum_name FROM coded_columns WHERE table_name = ? AND path = ?",
+                (table, path[2:] if path.startswith("$.") else path),
+            ).fetchone()
+            if row is None or row[0] is None:
+                raise SystemExit(f"{path} is not an enum column of {table}")
+            keys.append(f"t.{row[0]} AS k{i}")
+            # group on the integer codes first, then label the (few) groups
+            labels.append(f"e{i}.value")
+            joins.append(f"LEFT JOIN enum_codes e{i} ON e{i}.enum_name = ? AND e{i}.code = g.k{i}")
+            join_params.append(row[1])
+
+    group_by = ", ".join(str(i + 1) for i in range(len(paths)))
+    cursor = conn.execute(
+        f"""
+        SELECT {", ".join(labels)},
+               g.count,
+               ROUND(100.0 * g.count / SUM(g.count) OVER (), 2) AS percent
+        FROM (
+            SELECT {", ".join(keys)}, COUNT(*) AS count
+            FROM {table} t
+            GROUP BY {group_by}
+        ) g
+        {" ".join(joins)}
+        ORDER BY {group_by}
+        """,
+        key_params + join_params,
+    )
+    for row in cursor:
+        item = {path: row[i] for i, path in enumerate(paths)}
+        item["count"] = row["count"]
+        item["percent"] = row["percent"]
+        yield item
+
+
+def search(conn: sqlite3.Connection, query: str, limit: int = 25, offset: int = 0) -> sqlite3.Cursor:
+    """
+    bm25-ranked matches for an FTS5 query over the free-text fields (best first), with
+    a highlighted snippet from the best-matching field. Restrict a term to one field
+    with FTS5 column syntax, e.g. "trigger_event: deadline".
+    """
+    # databases written before the index existed are indexed on first search
+    with conn:
+        if not init_fts(conn):
+            raise SystemExit("This SQLite build has no FTS5 support.")
+    try:
+        return conn.execute(
+            f"""
+            SELECT scene_id,
+                   ROUND(bm25({FTS_TABLE}), 4) AS rank,
+                   snippet({FTS_TABLE}, -1, '[', ']', '...', 16) AS snippet
+            FROM {FTS_TABLE}
+            WHERE {FTS_TABLE} MATCH ?
+            ORDER BY rank
+            LIMIT ? OFFSET ?
+            """,
+            (query, limit, offset),
+        )
+    except sqlite3.OperationalError as exc:
+        raise SystemExit(f"Invalid search query {query!r}: {exc}")
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Query stored extraction results.")
     parser.add_argument(
@@ -48,59 +183,147 @@ def main() -> None:
         help="SQLite JSON path for filtering (e.g. $.comprehension_layer.emotional_state.felt_emotion)",
     )
     group.add_argument("--sql", type=str, help="Run a custom SELECT query")
+    group.add_argument(
+        "--index-path",
+        type=str,
+        action="append",
+        help="Declare a hot JSON path to materialise as an indexed generated column (repeatable). "
+        "Also migrates older databases to the default indexed paths.",
+    )
+    group.add_argument(
+        "--stats",
+        type=str,
+        metavar="PATH",
+        help="Histogram of the values at a JSON path (e.g. $.stakes_level)",
+    )
+    group.add_argument(
+        "--crosstab",
+        type=str,
+        nargs=2,
+        metavar=("ROW_PATH", "COL_PATH"),
+        help="Counts for every combination of values at two JSON paths",
+    )
+    group.add_argument(
+        "--search",
+        type=str,
+        metavar="QUERY",
+        help="Ranked full-text search over " + ", ".join(FTS_FIELDS) + " (FTS5 syntax: words, "
+        '"phrases", OR/NOT, prefix*, field: term); page with --limit/--offset',
+    )
+    group.add_argument(
+        "--jobs",
+        action="store_true",
+        help="Summarise the jobs table: scenes per status, attempts and mean duration",
+    )
+    parser.add_argument(
+        "--table",
+        type=str,
+        default="scenes",
+        help="Table for --stats/--crosstab: scenes (default) or a coded_<model> table from --storage coded",
+    )
     parser.add_argument("--equals", type=str, help="Match value for --json-path")
     parser.add_argument("--like", type=str, help="LIKE pattern for --json-path")
-    parser.add_argument("--limit", type=int, default=25, help="Limit for --json-path queries")
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=25,
+        help="Limit for --json-path and --search queries (-1 for no limit, best combined with --ndjson)",
+    )
+    parser.add_argument("--offset", type=int, default=0, help="Rows to skip for --search pages")
+    parser.add_argument(
+        "--after",
+        type=str,
+        help="Keyset pagination for --json-path: only return scene_ids sorting after this one "
+        "(pass the last scene_id of the previous page)",
+    )
+    parser.add_argument(
+        "--ndjson",
+        action="store_true",
+        help="Stream rows as newline-delimited JSON instead of one indented array",
+    )
     args = parser.parse_args()
 
+    if args.index_path:
+        connect(args.db).close()
+        try:
+            mapping = migrate_db(args.db, args.index_path)
+        except ValueError as exc:
+            raise SystemExit(str(exc))
+        print(json.dumps(mapping, ensure_ascii=True, indent=2))
+        return
+
     with connect(args.db) as conn:
+        if args.stats or args.crosstab:
+            paths = [args.stats] if args.stats else args.crosstab
+            for item in iter_stats(conn, paths, args.table):
+                print(json.dumps(item, ensure_ascii=True))
+            return
+
+        if args.search:
+            emit(search(conn, args.search, args.limit, args.offset), args.ndjson)
+            return
+
+        if args.jobs:
+            try:
+                cursor = conn.execute(
+                    """
+                    SELECT status,
+                           COUNT(*) AS count,
+                           SUM(attempts) AS attempts,
+                           ROUND(AVG(duration_s), 3) AS mean_duration_s
+                    FROM jobs
+                    GROUP BY status
+                    ORDER BY status
+                    """
+                )
+            except sqlite3.OperationalError:
+                print("No jobs recorded.")
+                return
+            stream_ndjson(cursor)
+            return
+
         if args.scene_id:
-            row = conn.execute(
-                "SELECT data_json FROM scenes WHERE scene_id = ?",
-                (args.scene_id,),
-            ).fetchone()
-            if not row:
+            data = load_scene(conn, args.scene_id)
+            if data is None:
                 print("No results.")
                 return
-            data = json.loads(row["data_json"])
             print(json.dumps(data, ensure_ascii=True, indent=2))
             return
 
         if args.json_path:
             if not args.equals and not args.like:
                 parser.error("--json-path requires --equals or --like")
-            if args.equals:
-                rows = conn.execute(
-                    """
-                    SELECT scene_id, data_json
-                    FROM scenes
-                    WHERE json_extract(data_json, ?) = ?
-                    ORDER BY scene_id
-                    LIMIT ?
-                    """,
-                    (args.json_path, args.equals, args.limit),
-                ).fetchall()
-            else:
-                rows = conn.execute(
-                    """
-                    SELECT scene_id, data_json
-                    FROM scenes
-                    WHERE json_extract(data_json, ?) LIKE ?
-                    ORDER BY scene_id
-                    LIMIT ?
-                    """,
-                    (args.json_path, args.like, args.limit),
-                ).fetchall()
-            print_rows(rows)
+            # use the indexed generated column when this path has been declared
+            column = indexed_paths(conn).get(args.json_path)
+            target = column if column else "json_extract(data_json, ?)"
+            params = () if column else (args.json_path,)
+            operator = "=" if args.equals else "LIKE"
+            value = args.equals if args.equals else args.like
+            after = "AND scene_id > ?" if args.after is not None else ""
+            params += (value,) + ((args.after,) if args.after is not None else ())
+            cursor = conn.execute(
+                f"""
+                SELECT scene_id, data_json
+                FROM scenes
+                WHERE {target} {operator} ? {after}
+                ORDER BY scene_id
+                LIMIT ?
+                """,
+                params + (args.limit,),
+            )
+            emit(cursor, args.ndjson)
             return
 
         sql = args.sql.strip()
         lowered = sql.lstrip().lower()
         if not (lowered.startswith("select") or lowered.startswith("with")):
             raise SystemExit("Only SELECT/WITH queries are allowed.")
-        rows = conn.execute(sql).fetchall()
-        print_rows(rows)
+        emit(conn.execute(sql), args.ndjson)
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    except BrokenPipeError:
+        # output piped into head/less that exited early
+        sys.stderr.close()
@@ -0,0 +1,153 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parent.parent / "response_cache.db"
+DEFAULT_MAX_ENTRIES = 100_000
+
+
+def cache_key(prompt: str, model: str) -> str:
+    """
+    Content address of a request: the final rendered prompt plus the model name.
+    The prompt already embeds the template and the schema's format instructions.
+    """
+    digest = hashlib.sha256()
+    digest.update(model.encode("utf-8"))
+    digest.update(b"\x00")
+    digest.update(prompt.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent SQLite cache of raw model responses, keyed by cache_key().
+
+    Entries older than max_age seconds are treated as misses, and the least recently
+    used entries are evicted once the cache holds more than max_entries rows. Several
+    processes may share one cache file (main.py --workers): the row count is re-read
+    before each eviction decision, and a locked database is waited on.
+
+    get() only reads. Hits are remembered and their accessed_at written with the next
+    put() or at close(), so a lookup never waits on another process's write lock.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path] = DEFAULT_CACHE_PATH,
+        max_entries: Optional[int] = DEFAULT_MAX_ENTRIES,
+        max_age: Optional[float] = None,
+    ) -> None:
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # key -> accessed_at of hits not yet written
+        self._touched: Dict[str, float] = {}
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # other workers may hold the write lock; wait rather than fail with "database is locked"
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+        )
+        self._conn.commit()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def get(self, prompt: str, model: str) -> Optional[str]:
+        key = cache_key(prompt, model)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            # an expired entry is overwritten by the put() that follows the miss
+            if row is None or (self.max_age is not None and now - row[1] > self.max_age):
+                self.misses += 1
+                return None
+            self._touched[key] = now
+            self.hits += 1
+            return row[0]
+
+    def put(self, prompt: str, model: str, response: str) -> None:
+        key = cache_key(prompt, model)
+        now = time.time()
+        with self._lock:
+            self._write_touches()
+            self._conn.execute(
+                """
+                INSERT INTO responses (key, model, response, created_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    response = excluded.response,
+                    created_at = excluded.created_at,
+                    accessed_at = excluded.accessed_at
+                """,
+                (key, model, response, now, now),
+            )
+            # counted inside this write transaction, so rows added by other processes
+            # sharing the file are included
+            self._entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if self.max_entries is not None and self._entries > self.max_entries:
+                # evict down to 90% so the scan below runs once per many inserts
+                keep = int(self.max_entries * 0.9)
+                self._entries -= self._conn.execute(
+                    """
+                    DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                    )
+                    """,
+                    (keep,),
+                ).rowcount
+            self._conn.commit()
+
+    def invalidate(self, prompt: str, model: str) -> None:
+        with self._lock:
+            self._entries -= self._conn.execute(
+                "DELETE FROM responses WHERE key = ?", (cache_key(prompt, model),)
+            ).rowcount
+            self._conn.commit()
+
+    def clear(self) -> int:
+        """
+        Drops every entry and returns how many were removed.
+        """
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM responses").rowcount
+            self._conn.commit()
+            self._entries = 0
+            self._touched.clear()
+            return removed
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": self._entries}
+
+    def _write_touches(self) -> None:
+        # within the caller's transaction, so recent hits count before any eviction
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            self._write_touches()
+            self._conn.commit()
+            self._conn.close()
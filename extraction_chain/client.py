@@ -0,0 +1,364 @@
+import asyncio
+import email.utils
+import random
+import sys
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from extraction_chain import instrumentation
+
+# httpx and the OpenAI SDK are imported inside ModelClient/is_retryable so that
+# importing the defaults below (e.g. for argparse) stays cheap.
+
+DEFAULT_TIMEOUT = 120.0
+DEFAULT_MAX_RETRIES = 6
+DEFAULT_MAX_CONNECTIONS = 64
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 60.0
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `per_minute` tokens per minute.
+
+    reserve() always succeeds: it takes the tokens (the balance may go negative) and
+    returns how long the caller must wait before using them, so concurrent callers
+    queue up fairly instead of polling.
+    """
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= min(amount, self.capacity)
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class RateLimiter:
+    """
+    Client-side requests-per-minute and tokens-per-minute limits. Either may be None.
+    """
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None) -> None:
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+
+    def reserve(self, tokens: int) -> float:
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.reserve(tokens))
+        return wait
+
+
+def estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    """
+    Cheap prompt-size estimate (~4 characters per token) used for TPM budgeting.
+    Images count 85 tokens at low detail and 765 (a typical 4-tile frame) otherwise.
+    """
+    chars = 0
+    images = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            for part in content:
+                if part.get("type") == "image_url":
+                    images += 85 if part["image_url"].get("detail") == "low" else 765
+                else:
+                    chars += len(part.get("text", ""))
+    return chars // 4 + 1 + images
+
+
+def retry_after(exc: Exception) -> Optional[float]:
+    """
+    Seconds requested by the server's Retry-After / retry-after-ms headers, if any.
+    """
+    response = getattr(exc, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):  # malformed header: fall back to the normal backoff
+        return None
+    return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+
+def is_retryable(exc: Exception) -> bool:
+    from openai import APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
+
+    if isinstance(exc, (RateLimitError, APITimeoutError, APIConnectionError)):
+        return True
+    return isinstance(exc, APIStatusError) and exc.status_code >= 500
+
+
+def backoff_delay(attempt: int, exc: Exception) -> float:
+    """
+    Full-jitter exponential backoff, never shorter than what the server asked for.
+    """
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    server_delay = retry_after(exc)
+    if server_delay is not None:
+        delay = max(delay, server_delay)
+    return delay
+
+
+class UsageStats:
+    """
+    Token usage summed over every successful call, including the prompt tokens the
+    provider served from its prefix cache (usage.prompt_tokens_details.cached_tokens).
+    """
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, response: Any) -> None:
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += usage.prompt_tokens or 0
+            self.completion_tokens += usage.completion_tokens or 0
+            self.cached_tokens += (getattr(details, "cached_tokens", None) or 0) if details else 0
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_ratio": round(self.cached_tokens / self.prompt_tokens, 4) if self.prompt_tokens else 0.0,
+        }
+
+
+class ModelClient:
+    """
+    Sync and async OpenAI clients sharing one configuration: pooled keep-alive HTTP
+    connections, a per-request timeout, client-side RPM/TPM limits, and retries with
+    jittered backoff on 429s, 5xx responses, timeouts and connection errors.
+
+    The SDK's own retries are disabled so every attempt goes through the rate limiter.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+    ) -> None:
+        import httpx
+        from openai import AsyncOpenAI, OpenAI
+
+        self.max_retries = max_retries
+        self.limiter = RateLimiter(rpm, tpm)
+        self.retries = 0
+        self.usage = UsageStats()
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=60.0,
+        )
+        http_timeout = httpx.Timeout(timeout, connect=min(10.0, timeout))
+        self.sync = OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=http_timeout,
+            max_retries=0,
+            http_client=httpx.Client(limits=limits, timeout=http_timeout),
+        )
+        self.async_ = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=http_timeout,
+            max_retries=0,
+            http_client=httpx.AsyncClient(limits=limits, timeout=http_timeout),
+        )
+
+    def complete(self, messages: List[Dict[str, Any]], model: str, **kwargs: Any):
+        """
+        Blocking chat completion; returns the SDK response object.
+        """
+        estimate = estimate_tokens(messages)
+        for attempt in range(self.max_retries + 1):
+            wait = self.limiter.reserve(estimate)
+            if wait:
+                instrumentation.record("rate_limit", wait)
+                time.sleep(wait)
+            start = time.perf_counter()
+            try:
+                raw = self.sync.chat.completions.with_raw_response.create(model=model, messages=messages, **kwargs)
+                response = raw.parse()
+            except Exception as exc:
+                instrumentation.record("request", time.perf_counter() - start, model=model, attempt=attempt, error=type(exc).__name__)
+                if attempt == self.max_retries or not is_retryable(exc):
+                    raise
+                delay = backoff_delay(attempt, exc)
+                self._log_retry(exc, attempt, delay)
+                time.sleep(delay)
+                continue
+            self._record(raw, response, model, attempt, time.perf_counter() - start)
+            return response
+
+    async def acomplete(self, messages: List[Dict[str, Any]], model: str, **kwargs: Any):
+        """
+        Async chat completion; returns the SDK response object.
+        """
+        estimate = estimate_tokens(messages)
+        for attempt in range(self.max_retries + 1):
+            wait = self.limiter.reserve(estimate)
+            if wait:
+                instrumentation.record("rate_limit", wait)
+                await asyncio.sleep(wait)
+            start = time.perf_counter()
+            try:
+                raw = await self.async_.chat.completions.with_raw_response.create(model=model, messages=messages, **kwargs)
+                response = raw.parse()
+            except Exception as exc:
+                instrumentation.record("request", time.perf_counter() - start, model=model, attempt=attempt, error=type(exc).__name__)
+                if attempt == self.max_retries or not is_retryable(exc):
+                    raise
+                delay = backoff_delay(attempt, exc)
+                self._log_retry(exc, attempt, delay)
+                await asyncio.sleep(delay)
+                continue
+            self._record(raw, response, model, attempt, time.perf_counter() - start)
+            return response
+
+    def stream(self, messages: List[Dict[str, Any]], model: str, **kwargs: Any) -> Iterator[str]:
+        """
+        Streamed chat completion; yields content deltas as they arrive.
+
+        Failed attempts are retried as in complete() until the server starts answering;
+        an error mid-stream is raised, since the deltas already yielded cannot be taken
+        back. Closing the generator early closes the connection, so the rest of the
+        generation is never read. Usage is only reported for streams read to the end.
+        """
+        estimate = estimate_tokens(messages)
+        for attempt in range(self.max_retries + 1):
+            wait = self.limiter.reserve(estimate)
+            if wait:
+                instrumentation.record("rate_limit", wait)
+                time.sleep(wait)
+            start = time.perf_counter()
+            try:
+                stream = self.sync.chat.completions.create(
+                    model=model, messages=messages, stream=True, stream_options={"include_usage": True}, **kwargs
+                )
+            except Exception as exc:
+                instrumentation.record("request", time.perf_counter() - start, model=model, attempt=attempt, error=type(exc).__name__)
+                if attempt == self.max_retries or not is_retryable(exc):
+                    raise
+                delay = backoff_delay(attempt, exc)
+                self._log_retry(exc, attempt, delay)
+                time.sleep(delay)
+                continue
+            break
+
+        # the final chunk carries usage for the whole completion and no choices
+        last = None
+        finished = False
+        try:
+            for chunk in stream:
+                if chunk.usage is not None:
+                    last = chunk
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+            finished = True
+        finally:
+            stream.close()
+            self._record(stream.response, last, model, attempt, time.perf_counter() - start, aborted=not finished)
+
+    async def astream(self, messages: List[Dict[str, Any]], model: str, **kwargs: Any) -> AsyncIterator[str]:
+        """
+        Async stream(); close it early with `await stream.aclose()`.
+        """
+        estimate = estimate_tokens(messages)
+        for attempt in range(self.max_retries + 1):
+            wait = self.limiter.reserve(estimate)
+            if wait:
+                instrumentation.record("rate_limit", wait)
+                await asyncio.sleep(wait)
+            start = time.perf_counter()
+            try:
+                stream = await self.async_.chat.completions.create(
+                    model=model, messages=messages, stream=True, stream_options={"include_usage": True}, **kwargs
+                )
+            except Exception as exc:
+                instrumentation.record("request", time.perf_counter() - start, model=model, attempt=attempt, error=type(exc).__name__)
+                if attempt == self.max_retries or not is_retryable(exc):
+                    raise
+                delay = backoff_delay(attempt, exc)
+                self._log_retry(exc, attempt, delay)
+                await asyncio.sleep(delay)
+                continue
+            break
+
+        last = None
+        finished = False
+        try:
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    last = chunk
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+            finished = True
+        finally:
+            await stream.close()
+            self._record(stream.response, last, model, attempt, time.perf_counter() - start, aborted=not finished)
+
+    def _record(self, raw: Any, response: Any, model: str, attempt: int, seconds: float, **fields: Any) -> None:
+        self.usage.record(response)
+        profiler = instrumentation.profiler
+        if profiler is None:
+            return
+        counts = profiler.record_usage(model, getattr(response, "usage", None))
+        profiler.record("request", seconds, model=model, attempt=attempt, **counts, **fields)
+        processing_ms = raw.headers.get("openai-processing-ms")
+        if processing_ms:
+            try:
+                profiler.record("generation", float(processing_ms) / 1000.0, model=model)
+            except ValueError:
+                pass
+
+    def _log_retry(self, exc: Exception, attempt: int, delay: float) -> None:
+        self.retries += 1
+        print(
+            f"model call failed ({type(exc).__name__}), retry {attempt + 1}/{self.max_retries} in {delay:.2f}s",
+            file=sys.stderr,
+        )
@@ -0,0 +1,34 @@
+import asyncio
+import copy
+from typing import Any, Awaitable, Callable, Dict
+
+
+class RequestCoalescer:
+    """
+    Shares one in-flight model call between concurrent identical requests.
+
+    The first caller for a key starts the call; callers arriving with the same key
+    while it is pending await the same future instead of issuing their own, and each
+    gets its own copy of the result (or the same exception). Keys are dropped once
+    the call finishes, so later duplicates go to the response cache, if any.
+    """
+
+    def __init__(self) -> None:
+        self.pending: Dict[str, asyncio.Future] = {}
+        self.calls = 0
+        self.saved = 0
+
+    async def run(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        future = self.pending.get(key)
+        if future is not None:
+            self.saved += 1
+            # shield: a cancelled follower must not cancel the shared call
+            return copy.deepcopy(await asyncio.shield(future))
+        future = asyncio.ensure_future(call())
+        self.pending[key] = future
+        future.add_done_callback(lambda _: self.pending.pop(key, None))
+        self.calls += 1
+        return await asyncio.shield(future)
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "saved": self.saved}
@@ -0,0 +1,128 @@
+"""
+Integer codes for the `str, Enum` fields in data_type.py.
+
+Codes belong to the database they are stored in (its enum_codes table). A fresh
+database numbers each enum's members in definition order; a value added later gets
+the next free code, and a stored code is never reassigned, so inserting, reordering
+or removing members in data_type.py does not relabel existing rows. Paths are dotted
+field names from the root model (e.g. "verdict.judgment"); a "[]" suffix marks a list
+of models/enums.
+"""
+import typing
+from enum import Enum
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+import extraction_chain.data_type as dt
+
+
+def all_enums() -> Dict[str, Type[Enum]]:
+    return {
+        name: obj
+        for name, obj in vars(dt).items()
+        if isinstance(obj, type) and issubclass(obj, Enum) and obj.__module__ == dt.__name__
+    }
+
+
+@lru_cache(maxsize=None)
+def value_to_code(enum: Type[Enum]) -> Dict[str, int]:
+    """
+    Members' positions in the class definition: the codes a fresh database starts from.
+    """
+    return {member.value: code for code, member in enumerate(enum)}
+
+
+def _unwrap(annotation: Any) -> Tuple[Any, bool]:
+    """
+    Strips Optional[...] and reports whether the annotation is a List[...].
+    """
+    origin = typing.get_origin(annotation)
+    if origin is typing.Union:
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return _unwrap(args[0])
+    if origin in (list, List):
+        inner, _ = _unwrap(typing.get_args(annotation)[0])
+        return inner, True
+    return annotation, False
+
+
+@lru_cache(maxsize=None)
+def enum_fields(data_model: Type[BaseModel]) -> Dict[str, Type[Enum]]:
+    """
+    Every enum-typed field reachable from data_model, keyed by dotted path.
+    """
+    fields: Dict[str, Type[Enum]] = {}
+    for name, field in data_model.model_fields.items():
+        annotation, is_list = _unwrap(field.annotation)
+        path = name + ("[]" if is_list else "")
+        if isinstance(annotation, type) and issubclass(annotation, Enum):
+            fields[path] = annotation
+        elif isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            for sub_path, enum in enum_fields(annotation).items():
+                fields[f"{path}.{sub_path}"] = enum
+    return fields
+
+
+def _transform(node: Any, parts: List[str], convert) -> Any:
+    if node is None:
+        return None
+    head, rest = parts[0], parts[1:]
+    is_list = head.endswith("[]")
+    key = head[:-2] if is_list else head
+    if not isinstance(node, dict) or key not in node:
+        return node
+    value = node[key]
+    if is_list and isinstance(value, list):
+        node[key] = [convert(item) if not rest else _transform(item, rest, convert) for item in value]
+    elif rest:
+        node[key] = _transform(value, rest, convert)
+    elif value is not None:
+        node[key] = convert(value)
+    return node
+
+
+def _copy(result: Any) -> Any:
+    if isinstance(result, dict):
+        return {key: _copy(value) for key, value in result.items()}
+    if isinstance(result, list):
+        return [_copy(item) for item in result]
+    return result
+
+
+def encode(
+    result: Dict[str, Any],
+    data_model: Type[BaseModel],
+    codes: Optional[Dict[str, Dict[str, int]]] = None,
+) -> Dict[str, Any]:
+    """
+    Copy of result with every enum value replaced by its integer code. `codes` is
+    {enum name: {value: code}} as stored in a database (db.stored_codes); without it
+    the definition-order codes of value_to_code are used.
+    """
+    coded = _copy(result)
+    for path, enum in enum_fields(data_model).items():
+        enum_codes = value_to_code(enum) if codes is None else codes.get(enum.__name__, {})
+
+        def convert(value: Any, enum=enum, enum_codes=enum_codes) -> int:
+            if isinstance(value, Enum):
+                value = value.value
+            try:
+                return enum_codes[value]
+            except (KeyError, TypeError):
+                raise ValueError(f"{value!r} is not a valid {enum.__name__}") from None
+
+        _transform(coded, path.split("."), convert)
+    return coded
+
+
+def decode(coded: Dict[str, Any], fields: Dict[str, Dict[int, str]]) -> Dict[str, Any]:
+    """
+    Inverse of encode(); `fields` is {path: {code: value}} as read back from the
+    database (db.coded_fields). Mutates and returns `coded`.
+    """
+    for path, values in fields.items():
+        _transform(coded, path.split("."), lambda code, values=values: values[code])
+    return coded
@@ -1,26 +1,359 @@
 # from langchain.chains import TransformChain
-from langchain_core.output_parsers import PydanticOutputParser
-from langchain_core.prompts import PromptTemplate
-from extraction_chain.image_perception import chat_completion
+import json
+import re
+from functools import lru_cache
 
+# LangChain and Pydantic are imported where first used so importing this module stays cheap
+from extraction_chain.cache import cache_key
+from extraction_chain.frames import image_key
+from extraction_chain.image_perception import async_chat_messages, chat_messages
+from extraction_chain.instrumentation import stage
+from extraction_chain.parsing import parse_response
+from extraction_chain.streaming import FieldValidationError, async_stream_messages, describe, stream_messages
 
-def extraction_chain(input, data_model, prompt_template, reasoning_model):
+DEFAULT_MAX_REPAIRS = 2
+
+# stands in for {format_instructions} when the schema travels as response_format instead
+STRUCTURED_FORMAT_NOTE = "Respond with a single JSON object. Its schema is enforced by the response format."
+
+REPAIR_PROMPT = """Your previous response did not validate against the required schema:
+
+{error}
+
+Reply again with only the corrected JSON object."""
+
+
+class CompiledChain:
+    """
+    Everything about a chain that depends only on (data_model, prompt_template):
+    the output parser, its format instructions (the serialised JSON schema) and
+    the partially-filled prompt. Build it once with compile_chain and reuse it per scene.
+
+    structured=True sends the schema as a native JSON-schema response_format instead
+    of embedding the format instructions in the prompt text.
+    """
+
+    def __init__(self, data_model, prompt_template, structured=False):
+        from langchain_core.output_parsers import PydanticOutputParser
+        from langchain_core.prompts import PromptTemplate
+
+        self.data_model = data_model
+        self.prompt_template = prompt_template
+        self.structured = structured
+
+        # using langchain's default message to enforce GPT to output structured info
+        self.parser = PydanticOutputParser(pydantic_object=data_model)
+        self.format_instructions = STRUCTURED_FORMAT_NOTE if structured else self.parser.get_format_instructions()
+        self.request_kwargs = {"response_format": response_format(data_model)} if structured else {}
+        # in structured mode the schema is not part of the prompt text, so it is appended
+        # to the prompt used for cache and coalescing keys
+        self.key_suffix = "\n" + json.dumps(self.request_kwargs, sort_keys=True) if structured else ""
+
+        self.prompt = PromptTemplate(
+            template=prompt_template,
+            input_variables=["input"],
+            partial_variables={"format_instructions": self.format_instructions})
+
+        # The part of the template before the paragraph holding {input} is identical for
+        # every scene. It is rendered once and sent as the system message, so the provider
+        # can serve it from its prompt cache; only the user message changes per scene.
+        system_template, user_template = split_template(prompt_template)
+        self.system_message = PromptTemplate(
+            template=system_template,
+            input_variables=[],
+            partial_variables={"format_instructions": self.format_instructions}).format() if system_template else ""
+        self.user_prompt = PromptTemplate(
+            template=user_template,
+            input_variables=["input"],
+            partial_variables={"format_instructions": self.format_instructions})
+
+    def render(self, input):
+        # puts the 1) input (user-provided input), 2) system message, 3) format instructions into one single string
+        return self.prompt.format(input=input)
+
+    def request_prompt(self, prompt_str, images=()):
+        """
+        What identifies a request for caching: the rendered prompt plus, in structured
+        mode, the response_format schema and, with images, the digest of each frame.
+        """
+        return prompt_str + self.key_suffix + image_key(images)
+
+    def parse(self, response):
+        return parse_response(response, self.data_model, self.parser)
+
+    def messages(self, input, images=()):
+        """
+        [system message (role description + schema), user message (this scene)].
+        images: EncodedFrames (see frames.FrameSampler) sent as image parts after the text
+        """
+        content = self.user_prompt.format(input=input)
+        if images:
+            content = [{"type": "text", "text": content}] + [frame.image_part() for frame in images]
+        user = {"role": "user", "content": content}
+        if not self.system_message:
+            return [user]
+        return [{"role": "system", "content": self.system_message}, user]
+
+    def repair_messages(self, response, error):
+        """
+        Follow-up turns asking the model to fix a response that failed validation.
+        A pydantic ValidationError is given as one line per failing field; the
+        response itself is already in the assistant turn.
+        """
+        from pydantic import ValidationError
+
+        message = describe(error) if isinstance(error, ValidationError) else str(error)
+        return [
+            {"role": "assistant", "content": response},
+            {"role": "user", "content": REPAIR_PROMPT.format(error=message[:2000])},
+        ]
+
+
+def split_template(prompt_template):
+    """
+    Splits a prompt template into (fixed prefix, per-scene part) at the blank line
+    before the paragraph containing {input}. Surrounding whitespace is stripped so the
+    prefix is byte-identical across scenes. A template with no such paragraph break
+    returns an empty prefix.
+    """
+    position = prompt_template.find("{input}")
+    if position == -1:
+        raise ValueError("prompt template must contain {input}")
+    head = prompt_template[:position].rstrip()
+    split = head.rfind("\n\n")
+    if split == -1:
+        return "", prompt_template.strip()
+    return prompt_template[:split].strip(), prompt_template[split:].strip()
+
+
+def response_format(data_model):
+    """
+    OpenAI JSON-schema response_format for data_model. Uses the SDK's strict-schema
+    conversion (every property required, no extra keys) when it is available, and a
+    plain non-strict schema otherwise; either way the result is still validated locally.
+    """
+    try:
+        from openai.lib._pydantic import to_strict_json_schema
+    except ImportError:
+        schema, strict = data_model.model_json_schema(), False
+    else:
+        schema, strict = _without_defaults(to_strict_json_schema(data_model)), True
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": data_model.__name__[:64], "schema": schema, "strict": strict},
+    }
+
+
+# keywords whose value maps names to schemas; a field may be called "default"
+SCHEMA_MAPS = ("properties", "$defs", "definitions", "patternProperties")
+
+
+def _without_defaults(schema):
+    # strict mode rejects "default" keywords; every field is required there anyway
+    if isinstance(schema, dict):
+        return {
+            key: {name: _without_defaults(item) for name, item in value.items()}
+            if key in SCHEMA_MAPS and isinstance(value, dict)
+            else _without_defaults(value)
+            for key, value in schema.items()
+            if key != "default"
+        }
+    if isinstance(schema, list):
+        return [_without_defaults(item) for item in schema]
+    return schema
+
+
+@lru_cache(maxsize=None)
+def compile_chain(data_model, prompt_template, structured=False):
+    return CompiledChain(data_model, prompt_template, structured)
+
+
+def build_prompt(input, data_model, prompt_template, structured=False):
+    """
+    Returns the compiled chain for data_model and the fully rendered prompt string.
+    """
+
+    chain = compile_chain(data_model, prompt_template, structured)
+    return chain, chain.render(input)
+
+
+def extraction_chain(
+    input,
+    data_model,
+    prompt_template,
+    reasoning_model,
+    cache=None,
+    structured=False,
+    max_repairs=DEFAULT_MAX_REPAIRS,
+    stream=False,
+    images=None,
+):
     """
     input: user-provided prompt
+    cache: optional ResponseCache; a hit skips the model call entirely
+    structured: send the schema as response_format instead of in the prompt text
+    max_repairs: times a response that fails validation is sent back to the model
+        with the error before giving up
+    stream: stream the response and validate each field as it arrives; the first
+        invalid field aborts the stream and counts as a failed attempt
+    images: optional keyframes from frames.FrameSampler.prepare, sent with the text
+    """
+
+    with stage("render"):
+        chain, prompt_str = build_prompt(input, data_model, prompt_template, structured)
+        messages = chain.messages(input, images or ())
+
+    key_prompt = chain.request_prompt(prompt_str, images or ())
+    response = cache.get(key_prompt, reasoning_model) if cache is not None else None
+    if response is not None:
+        with stage("parse", cached=True):
+            return chain.parse(response)
+
+    for attempt in range(max_repairs + 1):
+        if stream:
+            try:
+                response = stream_messages(messages, reasoning_model, data_model, **chain.request_kwargs)
+            except FieldValidationError as exc:
+                if attempt == max_repairs:
+                    raise
+                messages = messages + chain.repair_messages(exc.response, exc)
+                continue
+        else:
+            response = chat_messages(messages, reasoning_model, **chain.request_kwargs)
+        try:
+            with stage("parse"):
+                result = chain.parse(response)
+        except ValueError as exc:  # pydantic ValidationError and LangChain OutputParserException
+            if attempt == max_repairs:
+                raise
+            messages = messages + chain.repair_messages(response, exc)
+            continue
+        # only responses that validated are worth caching
+        if cache is not None:
+            cache.put(key_prompt, reasoning_model, response)
+        return result
+
+
+async def async_extraction_chain(
+    input,
+    data_model,
+    prompt_template,
+    reasoning_model,
+    cache=None,
+    structured=False,
+    max_repairs=DEFAULT_MAX_REPAIRS,
+    coalescer=None,
+    stream=False,
+    images=None,
+):
+    """
+    Same as extraction_chain, but awaits the model call so many scenes can be in flight at once.
+
+    coalescer: optional RequestCoalescer; concurrent calls with the same prompt and
+        model then share a single model call
+    """
+
+    with stage("render"):
+        chain, prompt_str = build_prompt(input, data_model, prompt_template, structured)
+        messages = chain.messages(input, images or ())
+
+    key_prompt = chain.request_prompt(prompt_str, images or ())
+    response = cache.get(key_prompt, reasoning_model) if cache is not None else None
+    if response is not None:
+        with stage("parse", cached=True):
+            return chain.parse(response)
+
+    async def call(messages=messages):
+        for attempt in range(max_repairs + 1):
+            if stream:
+                try:
+                    response = await async_stream_messages(messages, reasoning_model, data_model, **chain.request_kwargs)
+                except FieldValidationError as exc:
+                    if attempt == max_repairs:
+                        raise
+                    messages = messages + chain.repair_messages(exc.response, exc)
+                    continue
+            else:
+                response = await async_chat_messages(messages, reasoning_model, **chain.request_kwargs)
+            try:
+                with stage("parse"):
+                    result = chain.parse(response)
+            except ValueError as exc:
+                if attempt == max_repairs:
+                    raise
+                messages = messages + chain.repair_messages(response, exc)
+                continue
+            if cache is not None:
+                cache.put(key_prompt, reasoning_model, response)
+            return result
+
+    if coalescer is None:
+        return await call()
+    return await coalescer.run(cache_key(key_prompt, reasoning_model), call)
+
+
+def layer_key(data_model):
+    """
+    snake_case key a layer is stored under in a combined result (PerceptionLayer -> perception_layer).
+    """
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", data_model.__name__).lower()
+
+
+@lru_cache(maxsize=None)
+def combined_model(data_models):
+    """
+    Builds one Pydantic model with a required field per layer, so several layers can be
+    requested in a single call. data_models must be a tuple (it is the cache key).
+    """
+    from pydantic import create_model
+
+    fields = {layer_key(model): (model, ...) for model in data_models}
+    if len(fields) != len(data_models):
+        raise ValueError("each layer model may only be requested once")
+    combined = create_model(
+        "Combined" + "".join(model.__name__ for model in data_models),
+        **fields,
+    )
+    combined.__doc__ = "Analyze the scene for every layer below in one response:\n" + "\n".join(
+        f"- {key}: {' '.join((model.__doc__ or model.__name__).split())}"
+        for key, model in zip(fields, data_models)
+    )
+    return combined
+
+
+def resolve_layers(names):
+    """
+    Data model for a list of class names from data_models.py: SocialNormativeContext
+    when empty, otherwise combined_model of the named layers. Raises ValueError for
+    unknown names.
     """
+    from pydantic import BaseModel
+
+    from extraction_chain import data_models
+
+    def is_layer(obj):
+        # only models defined there, not BaseModel itself, enums or imported helpers
+        return isinstance(obj, type) and issubclass(obj, BaseModel) and obj.__module__ == data_models.__name__
 
-    # using langchain's default message to enforce GPT to output structured info
-    parser = PydanticOutputParser(pydantic_object=data_model)
+    if not names:
+        return data_models.SocialNormativeContext
+    unknown = [name for name in names if not is_layer(getattr(data_models, name, None))]
+    if unknown:
+        raise ValueError(f"unknown layer(s): {', '.join(unknown)}")
+    return combined_model(tuple(getattr(data_models, name) for name in names))
+
+
+def multi_layer_extraction(input, data_models, prompt_template, reasoning_model, **kwargs):
+    """
+    Extracts several layers (e.g. [PerceptionLayer, EmotionContext]) with one model call,
+    sending the scene text and prompt preamble once instead of once per layer.
+    Returns {layer_key(model): layer dict}. kwargs are passed to extraction_chain.
+    """
 
-    prompt = PromptTemplate(
-        template=prompt_template,
-        input_variables=["input"],
-        partial_variables={"format_instructions": parser.get_format_instructions()})
-    
+    return extraction_chain(input, combined_model(tuple(data_models)), prompt_template, reasoning_model, **kwargs)
 
-    # puts the 1) input (user-provided input), 2) system message, 3) format instructions into one single string
-    prompt_str = prompt.invoke({"input":input}).to_string()
 
-    response = chat_completion(prompt_str, reasoning_model)
-    
-    return parser.invoke(response).dict()
\ No newline at end of file
+async def async_multi_layer_extraction(input, data_models, prompt_template, reasoning_model, **kwargs):
+    return await async_extraction_chain(
+        input, combined_model(tuple(data_models)), prompt_template, reasoning_model, **kwargs
+    )
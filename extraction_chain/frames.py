@@ -0,0 +1,379 @@
+"""
+Video frames as model input: keyframe selection, downscaling and encoding.
+
+A scene's frames (image files in playback order) are reduced to the few that show
+something new. Each frame gets a 64-bit difference hash (dHash) of a tiny grayscale
+thumbnail, and a frame becomes a keyframe when its hash differs from the previous
+keyframe's by more than `threshold` bits. Keyframes are downscaled, re-encoded as
+JPEG and attached to the user message as image parts:
+
+    sampler = FrameSampler(max_frames=6, cache=FrameCache())
+    images = sampler.prepare(sorted(Path("scene_001").glob("*.jpg")))
+    extraction_chain(transcript, PerceptionLayer, prompt_template, "gpt-4o", images=images)
+
+Both the hashes and the encoded frames are cached by the SHA-256 of the source file,
+so a re-run decodes nothing.
+"""
+import base64
+import glob
+import hashlib
+import io
+import math
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+DEFAULT_FRAME_CACHE_PATH = Path(__file__).resolve().parent.parent / "frame_cache.db"
+DEFAULT_THRESHOLD = 10
+DEFAULT_MAX_FRAMES = 8
+DEFAULT_MAX_SIDE = 512
+DEFAULT_QUALITY = 75
+DEFAULT_DETAIL = "low"
+DETAILS = ("low", "high")
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif")
+
+# OpenAI vision pricing: a low-detail image is a flat 85 tokens; a high-detail one is
+# 85 plus 170 per 512px tile after fitting into 2048x2048 and a 768px shortest side
+BASE_IMAGE_TOKENS = 85
+TILE_TOKENS = 170
+HASH_SIZE = 8
+
+Frame = Union[str, Path, Any]  # a path or a PIL image
+
+
+def image_tokens(width: int, height: int, detail: str = DEFAULT_DETAIL) -> int:
+    """
+    Prompt tokens the API charges for one image of this size.
+    """
+    if detail == "low":
+        return BASE_IMAGE_TOKENS
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return BASE_IMAGE_TOKENS + TILE_TOKENS * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def frame_paths(spec: Union[str, Path, Sequence[Union[str, Path]]]) -> List[Path]:
+    """
+    Frame files for a directory (image files sorted by name), a glob pattern, or an
+    explicit list of paths (kept in the given order).
+    """
+    if not isinstance(spec, (str, Path)):
+        return [Path(path) for path in spec]
+    path = Path(spec)
+    if path.is_dir():
+        return sorted(child for child in path.iterdir() if child.suffix.lower() in IMAGE_SUFFIXES)
+    if path.exists():
+        return [path]
+    matches = sorted(glob.glob(str(spec)))
+    if not matches:
+        raise FileNotFoundError(f"no frames found for {spec}")
+    return [Path(match) for match in matches]
+
+
+def dhash(image: Any, size: int = HASH_SIZE) -> int:
+    """
+    Difference hash: one bit per horizontally adjacent pixel pair of a (size+1) x size
+    grayscale thumbnail, set where brightness increases. Similar frames differ in few bits.
+    """
+    from PIL import Image
+
+    small = image.convert("L").resize((size + 1, size), Image.Resampling.BILINEAR)
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(offset, offset + size):
+            bits = (bits << 1) | (pixels[col] < pixels[col + 1])
+    return bits
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def select_keyframes(
+    hashes: Sequence[int],
+    threshold: int = DEFAULT_THRESHOLD,
+    max_frames: Optional[int] = None,
+) -> List[int]:
+    """
+    Indices of the keyframes: the first frame, then each frame whose hash differs from
+    the last keyframe's by more than threshold bits. Beyond max_frames, an evenly
+    spaced subset is kept (always including the first and last keyframe).
+    """
+    if not hashes:
+        return []
+    keep = [0]
+    for index in range(1, len(hashes)):
+        if hamming(hashes[index], hashes[keep[-1]]) > threshold:
+            keep.append(index)
+    if max_frames is not None and len(keep) > max_frames:
+        if max_frames <= 1:
+            return keep[:max(max_frames, 0)]
+        step = (len(keep) - 1) / (max_frames - 1)
+        keep = [keep[round(i * step)] for i in range(max_frames)]
+    return keep
+
+
+class EncodedFrame:
+    """
+    A downscaled JPEG ready to send. `digest` is the SHA-256 of the encoded bytes,
+    so it identifies exactly what the model sees (used in response cache keys).
+    """
+
+    def __init__(self, data: bytes, width: int, height: int, detail: str = DEFAULT_DETAIL) -> None:
+        self.data = data
+        self.width = width
+        self.height = height
+        self.detail = detail
+        self.digest = hashlib.sha256(data).hexdigest()
+
+    @property
+    def tokens(self) -> int:
+        return image_tokens(self.width, self.height, self.detail)
+
+    def image_part(self) -> Dict[str, Any]:
+        url = "data:image/jpeg;base64," + base64.b64encode(self.data).decode("ascii")
+        return {"type": "image_url", "image_url": {"url": url, "detail": self.detail}}
+
+
+@contextmanager
+def open_frame(frame: Frame) -> Iterator[Any]:
+    """
+    The frame as a PIL image; a file is closed again when the block exits.
+    """
+    from PIL import Image
+
+    if isinstance(frame, (str, Path)):
+        with Image.open(frame) as image:
+            yield image
+    else:
+        yield frame
+
+
+def source_digest(frame: Frame) -> str:
+    """
+    SHA-256 of a frame file's bytes, or of a PIL image's mode, size and pixels.
+    """
+    digest = hashlib.sha256()
+    if isinstance(frame, (str, Path)):
+        with open(frame, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    else:
+        digest.update(f"{frame.mode}:{frame.size}".encode("ascii"))
+        digest.update(frame.tobytes())
+    return digest.hexdigest()
+
+
+def frame_hash(frame: Frame) -> int:
+    with open_frame(frame) as image:
+        if image is not frame:
+            # JPEG files can be decoded at 1/2..1/8 scale, which is all a 9x8 thumbnail needs
+            image.draft("L", (HASH_SIZE * 8, HASH_SIZE * 8))
+        return dhash(image)
+
+
+def encode_frame(
+    frame: Frame,
+    max_side: int = DEFAULT_MAX_SIDE,
+    quality: int = DEFAULT_QUALITY,
+    detail: str = DEFAULT_DETAIL,
+) -> EncodedFrame:
+    """
+    Applies the EXIF orientation, shrinks the frame to fit max_side x max_side (never
+    enlarges it) and re-encodes it as an optimised RGB JPEG.
+    """
+    from PIL import ImageOps
+
+    with open_frame(frame) as source:
+        # a transposed copy, so a caller's PIL image is never resized in place
+        image = ImageOps.exif_transpose(source)
+    image.thumbnail((max_side, max_side))
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return EncodedFrame(buffer.getvalue(), image.width, image.height, detail)
+
+
+class FrameCache:
+    """
+    Persistent SQLite cache of frame hashes and encoded frames, keyed by the source
+    frame's content digest (plus the encoding settings for encoded frames).
+    """
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_FRAME_CACHE_PATH) -> None:
+        self.path = str(path)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS frame_hashes (
+                digest TEXT PRIMARY KEY,
+                hash TEXT NOT NULL
+            ) WITHOUT ROWID;
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS encoded_frames (
+                key TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                width INTEGER NOT NULL,
+                height INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+
+    def get_hash(self, digest: str) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute("SELECT hash FROM frame_hashes WHERE digest = ?", (digest,)).fetchone()
+        # stored as hex: a 64-bit hash does not fit SQLite's signed INTEGER
+        return int(row[0], 16) if row is not None else None
+
+    def put_hash(self, digest: str, value: int) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO frame_hashes (digest, hash) VALUES (?, ?)", (digest, f"{value:x}"))
+            self._conn.commit()
+
+    def get_encoded(self, key: str, detail: str) -> Optional[EncodedFrame]:
+        with self._lock:
+            row = self._conn.execute("SELECT data, width, height FROM encoded_frames WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return EncodedFrame(row[0], row[1], row[2], detail)
+
+    def put_encoded(self, key: str, frame: EncodedFrame) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO encoded_frames (key, data, width, height, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, frame.data, frame.width, frame.height, time.time()),
+            )
+            self._conn.commit()
+
+    def clear(self) -> int:
+        """
+        Drops every entry and returns how many encoded frames were removed.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM frame_hashes")
+            removed = self._conn.execute("DELETE FROM encoded_frames").rowcount
+            self._conn.commit()
+            return removed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM encoded_frames").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class FrameSampler:
+    """
+    Frame sequence -> the keyframes worth sending, encoded within budget.
+
+    threshold: dHash bits (of 64) a frame must differ from the last keyframe by
+    max_frames: most keyframes per scene
+    max_side: longest side of an encoded frame in pixels
+    detail: "low" (a flat 85 tokens per image) or "high" (tiled, more tokens)
+    max_image_tokens: optional cap on the image tokens of one scene; lowers max_frames
+        (at least one frame is always sent)
+    cache: optional FrameCache
+    """
+
+    def __init__(
+        self,
+        threshold: int = DEFAULT_THRESHOLD,
+        max_frames: int = DEFAULT_MAX_FRAMES,
+        max_side: int = DEFAULT_MAX_SIDE,
+        quality: int = DEFAULT_QUALITY,
+        detail: str = DEFAULT_DETAIL,
+        max_image_tokens: Optional[int] = None,
+        cache: Optional[FrameCache] = None,
+    ) -> None:
+        if detail not in DETAILS:
+            raise ValueError(f"detail must be one of {', '.join(DETAILS)}")
+        if max_frames < 1:
+            raise ValueError("max_frames must be at least 1")
+        self.threshold = threshold
+        self.max_frames = max_frames
+        self.max_side = max_side
+        self.quality = quality
+        self.detail = detail
+        self.max_image_tokens = max_image_tokens
+        self.cache = cache
+        self.counts = {"scenes": 0, "frames": 0, "keyframes": 0, "image_tokens": 0}
+        self._lock = threading.Lock()
+
+    def _hash(self, frame: Frame, digest: str) -> int:
+        value = self.cache.get_hash(digest) if self.cache is not None else None
+        if value is None:
+            value = frame_hash(frame)
+            if self.cache is not None:
+                self.cache.put_hash(digest, value)
+        return value
+
+    def _encode(self, frame: Frame, digest: str) -> EncodedFrame:
+        key = f"{digest}:{self.max_side}:{self.quality}"
+        encoded = self.cache.get_encoded(key, self.detail) if self.cache is not None else None
+        if encoded is None:
+            encoded = encode_frame(frame, self.max_side, self.quality, self.detail)
+            if self.cache is not None:
+                self.cache.put_encoded(key, encoded)
+        return encoded
+
+    def prepare(self, frames: Union[str, Path, Iterable[Frame]]) -> List[EncodedFrame]:
+        """
+        Keyframes of `frames` (a directory, glob, or sequence of paths or PIL images in
+        playback order), encoded and ready for CompiledChain.messages(..., images).
+        """
+        if isinstance(frames, (str, Path)):
+            frames = frame_paths(frames)
+        frames = list(frames)
+        digests = [source_digest(frame) for frame in frames]
+        hashes = [self._hash(frame, digest) for frame, digest in zip(frames, digests)]
+
+        limit = self.max_frames
+        if self.max_image_tokens is not None:
+            # the largest frame max_side allows sets the per-frame cost
+            per_frame = image_tokens(self.max_side, self.max_side, self.detail)
+            limit = max(1, min(limit, self.max_image_tokens // per_frame))
+        selected = [self._encode(frames[index], digests[index]) for index in select_keyframes(hashes, self.threshold, limit)]
+
+        with self._lock:
+            self.counts["scenes"] += 1
+            self.counts["frames"] += len(frames)
+            self.counts["keyframes"] += len(selected)
+            self.counts["image_tokens"] += sum(frame.tokens for frame in selected)
+        return selected
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self.counts)
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        return stats
+
+
+def image_key(images: Sequence[EncodedFrame]) -> str:
+    """
+    What identifies a request's images for caching: detail and digest of each, in order.
+    """
+    return "".join(f"\n{frame.detail}:{frame.digest}" for frame in images)
+
@@ -1,21 +1,86 @@
-
-from openai import OpenAI
-from dotenv import load_dotenv
 import os
-load_dotenv()
 
-REASONING_API_KEY = os.getenv("OPENAI_API_KEY")
+from extraction_chain.client import ModelClient
+
+# The shared client is created on first use, so importing this module neither needs
+# OPENAI_API_KEY nor pays for the OpenAI SDK import.
+client = None
+
+def get_client():
+    global client
+    if client is None:
+        configure_client()
+    return client
+
+def configure_client(**kwargs):
+    """
+    Replaces the shared client, e.g. configure_client(timeout=60, rpm=500, tpm=400_000).
+    Accepts the keyword arguments of ModelClient.
+    """
+    global client
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    client = ModelClient(api_key=os.getenv("OPENAI_API_KEY"), **kwargs)
+    return client
+
+def set_client(new_client):
+    """
+    Installs any object with ModelClient's complete/acomplete interface, such as
+    replay.ReplayClient or replay.RecordingClient, as the shared client.
+    """
+    global client
+    client = new_client
+    return client
 
-client = OpenAI(api_key=REASONING_API_KEY)
+def chat_completion(prompt, model="gpt-4o", role="user", **kwargs):
 
-def chat_completion(prompt, model="gpt-4o", role="user"):
+
+    messages = [{"role": role, "content": prompt}]
+
+    return chat_messages(messages, model, **kwargs)
 
 
+async def async_chat_completion(prompt, model="gpt-4o", role="user", **kwargs):
+    """
+    Non-blocking variant of chat_completion used by the batch runner.
+    """
+
     messages = [{"role": role, "content": prompt}]
 
-    response = client.chat.completions.create(model=model,
-    messages=messages)
+    return await async_chat_messages(messages, model, **kwargs)
+
+
+def chat_messages(messages, model="gpt-4o", **kwargs):
+    """
+    Sends a full message list (e.g. a re-ask conversation); extra kwargs such as
+    response_format go to the chat-completions request.
+    """
+
+    response = get_client().complete(messages, model, **kwargs)
+
+    return response.choices[0].message.content
+
+
+async def async_chat_messages(messages, model="gpt-4o", **kwargs):
+
+    response = await get_client().acomplete(messages, model, **kwargs)
+
+    return response.choices[0].message.content
+
+
+def chat_choices(messages, model="gpt-4o", n=1, **kwargs):
+    """
+    Content of every choice from a single request for n samples.
+    """
+
+    response = get_client().complete(messages, model, n=n, **kwargs)
+
+    return [choice.message.content for choice in response.choices]
+
+
+async def async_chat_choices(messages, model="gpt-4o", n=1, **kwargs):
 
-    output = response.choices[0].message.content
-    return output
+    response = await get_client().acomplete(messages, model, n=n, **kwargs)
 
+    return [choice.message.content for choice in response.choices]
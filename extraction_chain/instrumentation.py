@@ -0,0 +1,145 @@
+"""
+Optional per-stage timing and token accounting for the extraction pipeline.
+
+Stages recorded when a profiler is enabled:
+
+    render       building the prompt messages for a scene
+    rate_limit   time spent waiting on the client-side RPM/TPM limiter
+    request      one HTTP attempt to the model, end to end (failed attempts included)
+    generation   server-side processing time reported by the openai-processing-ms header
+    first_token  streamed responses: first content delta, from the start of the call
+    first_field  streamed responses: first field validated, from the start of the call
+    aborted      streamed responses: stream cut off at an invalid field
+    parse        JSON parsing and Pydantic validation of a response
+    db           store_scene (one row)
+    db_batch     one SceneWriter transaction (many rows)
+
+Disabled (the default), stage() returns a shared no-op context manager and record()
+returns after a single None check.
+"""
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, List, Optional, TextIO
+
+PERCENTILES = (50, 95, 99)
+
+# scene being processed by the current task/thread, attached to every logged event
+current_scene_id: contextvars.ContextVar = contextvars.ContextVar("current_scene_id", default=None)
+
+profiler = None
+_DISABLED = nullcontext()
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted, non-empty list.
+    """
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+class Profiler:
+    """
+    Collects stage durations and token usage. With `log`, every event is also written
+    to it as one JSON object per line.
+    """
+
+    def __init__(self, log: Optional[TextIO] = None) -> None:
+        self.log = log
+        self.samples: Dict[str, List[float]] = {}
+        self.tokens: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float, **fields: Any) -> None:
+        ms = seconds * 1000.0
+        with self._lock:
+            self.samples.setdefault(stage, []).append(ms)
+            if self.log is not None:
+                event = {"ts": round(time.time(), 6), "stage": stage, "ms": round(ms, 3)}
+                scene_id = current_scene_id.get()
+                if scene_id is not None:
+                    event["scene_id"] = scene_id
+                event.update(fields)
+                self.log.write(json.dumps(event, default=str) + "\n")
+
+    def record_usage(self, model: str, usage: Any) -> Dict[str, int]:
+        """
+        Adds a response's usage to the per-model totals; returns the counts for logging.
+        """
+        if usage is None:
+            return {}
+        details = getattr(usage, "prompt_tokens_details", None)
+        counts = {
+            "prompt_tokens": usage.prompt_tokens or 0,
+            "completion_tokens": usage.completion_tokens or 0,
+            "cached_tokens": (getattr(details, "cached_tokens", None) or 0) if details else 0,
+        }
+        with self._lock:
+            totals = self.tokens.setdefault(model, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0})
+            totals["calls"] += 1
+            for key, value in counts.items():
+                totals[key] += value
+        return counts
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        {"stages": {stage: count/total/mean/p50/p95/p99 in ms}, "tokens": {model: totals}}.
+        """
+        with self._lock:
+            samples = {stage: sorted(values) for stage, values in self.samples.items()}
+            tokens = {model: dict(totals) for model, totals in self.tokens.items()}
+        stages = {}
+        for stage, ordered in samples.items():
+            total = sum(ordered)
+            stats = {"count": len(ordered), "total_ms": round(total, 3), "mean_ms": round(total / len(ordered), 3)}
+            for pct in PERCENTILES:
+                stats[f"p{pct}_ms"] = round(percentile(ordered, pct), 3)
+            stages[stage] = stats
+        return {"stages": stages, "tokens": tokens}
+
+
+def enable(log: Optional[TextIO] = None) -> Profiler:
+    """
+    Installs a fresh process-wide Profiler and returns it.
+    """
+    global profiler
+    profiler = Profiler(log)
+    return profiler
+
+
+def disable() -> Optional[Profiler]:
+    """
+    Stops recording; returns the profiler that was active, if any.
+    """
+    global profiler
+    previous, profiler = profiler, None
+    return previous
+
+
+@contextmanager
+def _timed(active: Profiler, name: str, fields: Dict[str, Any]):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        active.record(name, time.perf_counter() - start, **fields)
+
+
+def stage(name: str, **fields: Any):
+    """
+    Context manager timing one stage: `with stage("parse"): ...`.
+    """
+    if profiler is None:
+        return _DISABLED
+    return _timed(profiler, name, fields)
+
+
+def record(name: str, seconds: float, **fields: Any) -> None:
+    """
+    Records a duration measured elsewhere (e.g. a server-reported timing).
+    """
+    if profiler is not None:
+        profiler.record(name, seconds, **fields)
@@ -0,0 +1,55 @@
+"""
+Fast path from a raw completion string to a result dict.
+
+pydantic-core parses and validates the JSON in one pass (TypeAdapter.validate_json),
+skipping LangChain's generic output parsing and the stdlib json module. Anything the
+fast path rejects goes through the PydanticOutputParser as before.
+"""
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def type_adapter(data_model):
+    from pydantic import TypeAdapter
+
+    return TypeAdapter(data_model)
+
+
+def strip_code_fence(text):
+    """
+    Removes a surrounding ```json ... ``` fence, which models often add despite instructions.
+    """
+    text = text.strip()
+    if text.startswith("```"):
+        first_newline = text.find("\n")
+        if first_newline != -1 and text.endswith("```"):
+            return text[first_newline + 1:-3].strip()
+    return text
+
+
+def parse_response(response, data_model, parser=None):
+    """
+    Validates response against data_model and returns it as a JSON-ready dict
+    (enum fields as their string values).
+
+    parser: the chain's PydanticOutputParser, used as the fallback for output the fast
+    path cannot read (e.g. a fenced JSON block embedded in prose). Without one, or
+    when the text was valid JSON and only its fields failed, the fast path's
+    ValidationError is raised: it names each failing field, whereas the parser's
+    error starts by echoing the whole completion.
+    """
+    from pydantic import ValidationError
+
+    adapter = type_adapter(data_model)
+    try:
+        model = adapter.validate_json(strip_code_fence(response))
+    except ValidationError as exc:
+        if parser is None:
+            raise
+        try:
+            model = parser.invoke(response)
+        except ValueError:
+            if all(error["type"] == "json_invalid" for error in exc.errors()):
+                raise
+            raise exc from None
+    return adapter.dump_python(model, mode="json")
@@ -0,0 +1,264 @@
+"""
+Record/replay stand-ins for ModelClient, so the pipeline can run offline.
+
+A fixture is a JSONL file with one recorded exchange per line:
+
+    {"key": ..., "model": "gpt-4o", "content": "<assistant message>", "usage": {...}}
+
+A request for several completions (n > 1, as the cascade's sample tiers send) also
+stores every one of them under "choices". `key` is request_key(messages, model, n), so
+a replayed run must render exactly the same messages (template, schema and scene
+text) and ask for the same number of completions as the recorded one. Install either client
+with image_perception.set_client(), or use main.py --record / --replay.
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Union
+
+from extraction_chain import instrumentation
+from extraction_chain.cache import cache_key
+from extraction_chain.client import UsageStats
+
+# characters per replayed stream delta (a few tokens, as the API sends them)
+STREAM_CHUNK_CHARS = 16
+
+
+def request_key(messages: List[Dict[str, Any]], model: str, n: int = 1) -> str:
+    # n=1 keeps the key of fixtures recorded before n was part of it
+    return cache_key(json.dumps(messages, sort_keys=True, ensure_ascii=False), model if n == 1 else f"{model}:n={n}")
+
+
+def fixture_entry(
+    messages: List[Dict[str, Any]],
+    model: str,
+    content: str,
+    usage: Optional[Dict[str, Any]] = None,
+    choices: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    `choices` holds every completion of an n > 1 request (content is the first).
+    """
+    n = len(choices) if choices else 1
+    entry = {"key": request_key(messages, model, n), "model": model, "content": content, "usage": usage}
+    if n > 1:
+        entry["choices"] = choices
+    return entry
+
+
+def write_fixture(path: Union[str, Path], entries: Iterable[Dict[str, Any]]) -> int:
+    """
+    Writes fixture_entry() dicts to path (overwriting it); returns how many were written.
+    """
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def _usage_dict(usage: Any) -> Optional[Dict[str, Any]]:
+    if usage is None:
+        return None
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": usage.prompt_tokens or 0,
+        "completion_tokens": usage.completion_tokens or 0,
+        "prompt_tokens_details": {"cached_tokens": (getattr(details, "cached_tokens", None) or 0) if details else 0},
+    }
+
+
+def _response(contents: List[str], usage: Optional[Dict[str, Any]]) -> SimpleNamespace:
+    """
+    Just enough of the SDK's ChatCompletion shape for chat_messages, chat_choices and
+    the usage counters.
+    """
+    if usage is not None:
+        details = SimpleNamespace(**usage.get("prompt_tokens_details", {"cached_tokens": 0}))
+        usage = SimpleNamespace(
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+            prompt_tokens_details=details,
+        )
+    choices = [
+        SimpleNamespace(index=index, message=SimpleNamespace(role="assistant", content=content), finish_reason="stop")
+        for index, content in enumerate(contents)
+    ]
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+class RecordingClient:
+    """
+    Wraps a live client and appends every successful exchange to a fixture file.
+    """
+
+    def __init__(self, inner: Any, path: Union[str, Path]) -> None:
+        self.inner = inner
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    @property
+    def retries(self) -> int:
+        return self.inner.retries
+
+    @property
+    def usage(self) -> UsageStats:
+        return self.inner.usage
+
+    def complete(self, messages: List[Dict[str, Any]], model: str, **kwargs: Any):
+        response = self.inner.complete(messages, model, **kwargs)
+        self._save(messages, model, self._contents(response), getattr(response, "usage", None))
+        return response
+
+    async def acomplete(self, messages: List[Dict[str, Any]], model: str, **kwargs: Any):
+        response = await self.inner.acomplete(messages, model, **kwargs)
+        self._save(messages, model, self._contents(response), getattr(response, "usage", None))
+        return response
+
+    @staticmethod
+    def _contents(response: Any) -> List[str]:
+        return [choice.message.content for choice in sorted(response.choices, key=lambda choice: choice.index)]
+
+    def stream(self, messages: List[Dict[str, Any]], model: str, **kwargs: Any) -> Iterator[str]:
+        """
+        Streams from the inner client; only a stream read to the end is recorded, and
+        without usage (the deltas do not carry it).
+        """
+        parts = []
+        inner = self.inner.stream(messages, model, **kwargs)
+        try:
+            for chunk in inner:
+                parts.append(chunk)
+                yield chunk
+        finally:
+            inner.close()
+        self._save(messages, model, ["".join(parts)], None)
+
+    async def astream(self, messages: List[Dict[str, Any]], model: str, **kwargs: Any) -> AsyncIterator[str]:
+        parts = []
+        inner = self.inner.astream(messages, model, **kwargs)
+        try:
+            async for chunk in inner:
+                parts.append(chunk)
+                yield chunk
+        finally:
+            await inner.aclose()
+        self._save(messages, model, ["".join(parts)], None)
+
+    def _save(self, messages: List[Dict[str, Any]], model: str, contents: List[str], usage: Any) -> None:
+        entry = fixture_entry(messages, model, contents[0], _usage_dict(usage), contents if len(contents) > 1 else None)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+class ReplayClient:
+    """
+    Answers from a fixture file instead of the network. Each call waits `latency`
+    seconds, varied by up to ±`jitter` of itself from a seeded RNG, so runs are
+    repeatable. A request with no recorded response, or with fewer recorded
+    completions than its `n` asks for, raises LookupError.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.retries = 0
+        self.usage = UsageStats()
+        self.misses = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    # a later recording of the same request wins
+                    self.entries[entry["key"]] = entry
+
+    def delay(self) -> float:
+        if not self.latency:
+            return 0.0
+        with self._lock:
+            spread = self._random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0
+        return max(0.0, self.latency * (1.0 + spread))
+
+    def lookup(self, messages: List[Dict[str, Any]], model: str, n: int = 1) -> SimpleNamespace:
+        entry = self.entries.get(request_key(messages, model, n))
+        contents = (entry.get("choices") or [entry["content"]]) if entry is not None else []
+        if len(contents) < n:
+            with self._lock:
+                self.misses += 1
+            if entry is None:
+                raise LookupError(f"no recorded response for this {model} request")
+            raise LookupError(f"{len(contents)} of {n} completions recorded for this {model} request")
+        response = _response(contents[:n], entry.get("usage"))
+        self.usage.record(response)
+        if instrumentation.profiler is not None:
+            instrumentation.profiler.record_usage(model, response.usage)
+        return response
+
+    def complete(self, messages: List[Dict[str, Any]], model: str, **kwargs: Any):
+        start = time.perf_counter()
+        wait = self.delay()
+        if wait:
+            time.sleep(wait)
+        response = self.lookup(messages, model, kwargs.get("n", 1))
+        instrumentation.record("request", time.perf_counter() - start, model=model, replayed=True)
+        return response
+
+    async def acomplete(self, messages: List[Dict[str, Any]], model: str, **kwargs: Any):
+        start = time.perf_counter()
+        wait = self.delay()
+        if wait:
+            await asyncio.sleep(wait)
+        response = self.lookup(messages, model, kwargs.get("n", 1))
+        instrumentation.record("request", time.perf_counter() - start, model=model, replayed=True)
+        return response
+
+    def stream(self, messages: List[Dict[str, Any]], model: str, **kwargs: Any) -> Iterator[str]:
+        """
+        Replays the recorded content in STREAM_CHUNK_CHARS deltas, spreading the call's
+        latency evenly over them, so time-to-first-field can be measured offline.
+        """
+        start = time.perf_counter()
+        chunks = self._chunks(self.lookup(messages, model))
+        wait = self.delay() / len(chunks)
+        finished = False
+        try:
+            for chunk in chunks:
+                if wait:
+                    time.sleep(wait)
+                yield chunk
+            finished = True
+        finally:
+            instrumentation.record("request", time.perf_counter() - start, model=model, replayed=True, aborted=not finished)
+
+    async def astream(self, messages: List[Dict[str, Any]], model: str, **kwargs: Any) -> AsyncIterator[str]:
+        start = time.perf_counter()
+        chunks = self._chunks(self.lookup(messages, model))
+        wait = self.delay() / len(chunks)
+        finished = False
+        try:
+            for chunk in chunks:
+                if wait:
+                    await asyncio.sleep(wait)
+                yield chunk
+            finished = True
+        finally:
+            instrumentation.record("request", time.perf_counter() - start, model=model, replayed=True, aborted=not finished)
+
+    @staticmethod
+    def _chunks(response: SimpleNamespace) -> List[str]:
+        content = response.choices[0].message.content or ""
+        return [content[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(content), STREAM_CHUNK_CHARS)] or [""]
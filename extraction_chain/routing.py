@@ -0,0 +1,211 @@
+"""
+Cheap-first model cascade.
+
+Every tier but the last asks for `samples` completions in one request (the `n`
+parameter, so the prompt is billed once). The tier's answer is accepted when every
+sample validates and all samples agree at each consistency path, e.g.
+verdict.judgment. Otherwise the scene escalates to the next tier. The last tier is a
+plain extraction_chain call with the usual repair loop.
+"""
+import asyncio
+import threading
+import time
+
+from extraction_chain.cache import cache_key
+from extraction_chain.extraction_chain import DEFAULT_MAX_REPAIRS, async_extraction_chain, build_prompt, extraction_chain
+from extraction_chain.image_perception import async_chat_choices, chat_choices
+from extraction_chain.instrumentation import stage
+
+DEFAULT_TIERS = ("gpt-4o-mini", "gpt-4o")
+DEFAULT_SAMPLES = 2
+DEFAULT_CONSISTENCY_PATHS = ("verdict.judgment",)
+
+
+def value_at(result, path):
+    """
+    Value at a dotted path of a result dict, or None where the path does not exist.
+    """
+    node = result
+    for key in path.split("."):
+        if not isinstance(node, dict):
+            return None
+        node = node.get(key)
+    return node
+
+
+class CascadeRouter:
+    """
+    Tries each model in `tiers` in order and stops at the first answer that passes
+    validation and, for all but the last tier, the consistency check.
+
+    stats() reports per-tier acceptance and escalation counts, hit rates and mean
+    seconds per scene.
+    """
+
+    def __init__(self, tiers=DEFAULT_TIERS, samples=DEFAULT_SAMPLES, consistency_paths=DEFAULT_CONSISTENCY_PATHS):
+        if not tiers:
+            raise ValueError("a cascade needs at least one model")
+        if samples < 1:
+            raise ValueError("samples must be at least 1")
+        self.tiers = tuple(tiers)
+        self.samples = samples
+        self.consistency_paths = tuple(consistency_paths)
+        self.counts = {
+            model: {"accepted": 0, "invalid": 0, "disagreement": 0, "failed": 0, "seconds": 0.0}
+            for model in self.tiers
+        }
+        self._lock = threading.Lock()
+
+    def _count(self, model, outcome, seconds=0.0):
+        with self._lock:
+            self.counts[model][outcome] += 1
+            if outcome == "accepted":
+                self.counts[model]["seconds"] += seconds
+
+    def _judge(self, chain, responses):
+        """
+        (result, None) if the samples validate and agree, else (None, reason).
+        """
+        results = []
+        for response in responses:
+            try:
+                with stage("parse"):
+                    results.append(chain.parse(response))
+            except ValueError:
+                return None, "invalid"
+        for path in self.consistency_paths:
+            if len({repr(value_at(result, path)) for result in results}) > 1:
+                return None, "disagreement"
+        return results[0], None
+
+    def extract(self, input, data_model, prompt_template, cache=None, structured=False, max_repairs=DEFAULT_MAX_REPAIRS):
+        start = time.perf_counter()
+        with stage("render"):
+            chain, prompt_str = build_prompt(input, data_model, prompt_template, structured)
+            messages = chain.messages(input)
+        key_prompt = chain.request_prompt(prompt_str)
+
+        for model in self.tiers[:-1]:
+            cached = cache.get(key_prompt, model) if cache is not None else None
+            if cached is not None:
+                self._count(model, "accepted", time.perf_counter() - start)
+                return chain.parse(cached)
+            try:
+                responses = chat_choices(messages, model, n=self.samples, **chain.request_kwargs)
+            except Exception:
+                self._count(model, "failed")
+                continue
+            result, reason = self._judge(chain, responses)
+            if reason is not None:
+                self._count(model, reason)
+                continue
+            if cache is not None:
+                cache.put(key_prompt, model, responses[0])
+            self._count(model, "accepted", time.perf_counter() - start)
+            return result
+
+        model = self.tiers[-1]
+        try:
+            result = extraction_chain(
+                input, data_model, prompt_template, model, cache=cache, structured=structured, max_repairs=max_repairs
+            )
+        except Exception:
+            self._count(model, "failed")
+            raise
+        self._count(model, "accepted", time.perf_counter() - start)
+        return result
+
+    async def aextract(
+        self,
+        input,
+        data_model,
+        prompt_template,
+        cache=None,
+        structured=False,
+        max_repairs=DEFAULT_MAX_REPAIRS,
+        coalescer=None,
+    ):
+        """
+        Async extract(). With a coalescer, concurrent identical scenes share one cascade.
+        """
+        if coalescer is None:
+            return await self._aextract(input, data_model, prompt_template, cache, structured, max_repairs)
+        chain, prompt_str = build_prompt(input, data_model, prompt_template, structured)
+        key = cache_key(chain.request_prompt(prompt_str), "cascade:" + ",".join(self.tiers))
+        return await coalescer.run(
+            key, lambda: self._aextract(input, data_model, prompt_template, cache, structured, max_repairs)
+        )
+
+    async def _aextract(self, input, data_model, prompt_template, cache, structured, max_repairs):
+        start = time.perf_counter()
+        with stage("render"):
+            chain, prompt_str = build_prompt(input, data_model, prompt_template, structured)
+            messages = chain.messages(input)
+        key_prompt = chain.request_prompt(prompt_str)
+
+        for model in self.tiers[:-1]:
+            cached = cache.get(key_prompt, model) if cache is not None else None
+            if cached is not None:
+                self._count(model, "accepted", time.perf_counter() - start)
+                return chain.parse(cached)
+            try:
+                responses = await async_chat_choices(messages, model, n=self.samples, **chain.request_kwargs)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._count(model, "failed")
+                continue
+            result, reason = self._judge(chain, responses)
+            if reason is not None:
+                self._count(model, reason)
+                continue
+            if cache is not None:
+                cache.put(key_prompt, model, responses[0])
+            self._count(model, "accepted", time.perf_counter() - start)
+            return result
+
+        model = self.tiers[-1]
+        try:
+            result = await async_extraction_chain(
+                input, data_model, prompt_template, model, cache=cache, structured=structured, max_repairs=max_repairs
+            )
+        except Exception:
+            self._count(model, "failed")
+            raise
+        self._count(model, "accepted", time.perf_counter() - start)
+        return result
+
+    def stats(self):
+        """
+        {model: {accepted, invalid, disagreement, failed, hit_rate, mean_s}}. hit_rate is
+        the share of all routed scenes answered by that tier; mean_s is the mean wall time
+        of scenes it answered, including the time spent in tiers before it.
+        """
+        with self._lock:
+            return _summarise({model: dict(values) for model, values in self.counts.items()})
+
+
+def _summarise(counts):
+    # a scene is routed once it is accepted somewhere or fails in the last tier
+    routed = sum(values["accepted"] for values in counts.values())
+    if counts:
+        routed += list(counts.values())[-1]["failed"]
+    for values in counts.values():
+        seconds = values.pop("seconds")
+        values["hit_rate"] = round(values["accepted"] / routed, 4) if routed else 0.0
+        values["mean_s"] = round(seconds / values["accepted"], 4) if values["accepted"] else None
+    return counts
+
+
+def combine_stats(summaries):
+    """
+    Merges CascadeRouter.stats() from several workers into one summary.
+    """
+    counts = {}
+    for summary in summaries:
+        for model, values in summary.items():
+            total = counts.setdefault(model, {"accepted": 0, "invalid": 0, "disagreement": 0, "failed": 0, "seconds": 0.0})
+            for key in ("accepted", "invalid", "disagreement", "failed"):
+                total[key] += values[key]
+            total["seconds"] += (values["mean_s"] or 0.0) * values["accepted"]
+    return _summarise(counts)
@@ -0,0 +1,231 @@
+"""
+Streamed completions validated field by field while they arrive.
+
+The response is scanned as it streams in. Each time a JSON value inside the result
+is complete (a string, number, list or object), it is validated against the schema
+of the field it belongs to. The first invalid value aborts the stream, so an invalid
+enum early in a long answer costs only the tokens generated up to that point. The
+chain then re-asks with the error, as it does for any response that fails validation.
+
+Stages recorded while profiling (seconds since the call started):
+
+    first_token  first content delta received
+    first_field  first field validated
+    aborted      stream cut off at an invalid field (tagged with its path)
+"""
+import json
+import re
+import time
+import typing
+from functools import lru_cache
+
+from extraction_chain import instrumentation
+from extraction_chain.image_perception import get_client
+
+STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.S)
+# a number, true, false or null; only complete once a delimiter follows it
+SCALAR = re.compile(r"[^\s,\]}]+")
+WHITESPACE = " \t\r\n"
+
+
+class FieldValidationError(ValueError):
+    """
+    A field of a streamed response failed validation. `response` holds the text
+    received up to and including the invalid value.
+    """
+
+    def __init__(self, path, message, response):
+        super().__init__(f"{path}: {message}")
+        self.path = path
+        self.response = response
+
+
+def _unwrap_optional(annotation):
+    if typing.get_origin(annotation) is typing.Union:
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+@lru_cache(maxsize=None)
+def field_adapters(data_model):
+    """
+    {path: TypeAdapter} for every field reachable from data_model. Paths are dotted
+    field names as in enum_codes, with "[]" standing for the items of a list
+    (e.g. "verdict.violations[].cause_category").
+    """
+    from pydantic import BaseModel, TypeAdapter
+
+    adapters = {}
+
+    def walk(model, prefix, seen):
+        for name, field in model.model_fields.items():
+            path = prefix + name
+            # the FieldInfo carries constraints such as ge/le/max_length
+            adapters[path] = TypeAdapter(typing.Annotated[field.annotation, field])
+            annotation = _unwrap_optional(field.annotation)
+            if typing.get_origin(annotation) in (list, typing.List):
+                annotation = _unwrap_optional(typing.get_args(annotation)[0])
+                path += "[]"
+                adapters[path] = TypeAdapter(annotation)
+            if isinstance(annotation, type) and issubclass(annotation, BaseModel) and annotation not in seen:
+                walk(annotation, path + ".", seen | {annotation})
+
+    walk(data_model, "", {data_model})
+    return adapters
+
+
+def describe(error):
+    """
+    One line per pydantic error, without the type banner and documentation links.
+    """
+    parts = []
+    for item in error.errors(include_url=False):
+        location = ".".join(str(part) for part in item["loc"])
+        parts.append(f"{location}: {item['msg']}" if location else item["msg"])
+    return "; ".join(parts)
+
+
+class IncrementalValidator:
+    """
+    Feed it a response chunk by chunk; it raises FieldValidationError at the first
+    complete value that does not validate against its field.
+
+    Text before the first "{" (e.g. an opening code fence) is skipped. Values at
+    paths the schema does not know are not checked, and output the scanner cannot
+    follow simply ends the scan: either way the final parse has the last word.
+    """
+
+    def __init__(self, data_model):
+        self.adapters = field_adapters(data_model)
+        self.text = ""
+        self.validated = 0
+        self.done = False
+        self._pos = 0
+        # open containers as [bracket, path, start offset, current key]
+        self._stack = []
+
+    def feed(self, chunk):
+        self.text += chunk
+        if not self.done:
+            self._scan()
+
+    def _child_path(self, frame):
+        bracket, path, _, key = frame
+        if bracket == "[":
+            return path + "[]"
+        return f"{path}.{key}" if path else key
+
+    def _scan(self):
+        text, pos, stack = self.text, self._pos, self._stack
+        end = len(text)
+        while pos < end:
+            char = text[pos]
+            if char in WHITESPACE:
+                pos += 1
+                continue
+            if not stack:
+                if char == "{":
+                    stack.append(["{", "", pos, None])
+                pos += 1
+                continue
+            frame = stack[-1]
+            if char == '"':
+                match = STRING.match(text, pos)
+                if match is None:  # the string continues in a later chunk
+                    break
+                if frame[0] == "{" and frame[3] is None:
+                    frame[3] = json.loads(match.group())
+                else:
+                    self._check(self._child_path(frame), pos, match.end())
+                pos = match.end()
+            elif char == ":":
+                pos += 1
+            elif char == ",":
+                if frame[0] == "{":
+                    frame[3] = None
+                pos += 1
+            elif char in "{[":
+                if frame[0] == "{" and frame[3] is None:
+                    self.done = True
+                    break
+                stack.append([char, self._child_path(frame), pos, None])
+                pos += 1
+            elif char in "}]":
+                bracket, path, start, _ = stack.pop()
+                pos += 1
+                if bracket != ("{" if char == "}" else "["):
+                    self.done = True
+                    break
+                if not stack:  # the root object itself is left to the final parse
+                    self.done = True
+                    break
+                self._check(path, start, pos)
+            else:
+                match = SCALAR.match(text, pos)
+                if match.end() == end:  # a number may continue in the next chunk
+                    break
+                if frame[0] == "{" and frame[3] is None:
+                    self.done = True
+                    break
+                self._check(self._child_path(frame), pos, match.end())
+                pos = match.end()
+        self._pos = pos
+
+    def _check(self, path, start, end):
+        adapter = self.adapters.get(path)
+        if adapter is None:
+            return
+        from pydantic import ValidationError
+
+        value = self.text[start:end]
+        try:
+            adapter.validate_json(value)
+        except ValidationError as exc:
+            self.done = True
+            shown = value if len(value) <= 200 else value[:200] + "..."
+            raise FieldValidationError(path, f"{describe(exc)} (got {shown})", self.text[:end]) from None
+        self.validated += 1
+
+
+def _feed(validator, chunk, start, model):
+    if not validator.text:
+        instrumentation.record("first_token", time.perf_counter() - start, model=model)
+    validated = validator.validated
+    try:
+        validator.feed(chunk)
+    except FieldValidationError as exc:
+        instrumentation.record("aborted", time.perf_counter() - start, model=model, path=exc.path)
+        raise
+    if not validated and validator.validated:
+        instrumentation.record("first_field", time.perf_counter() - start, model=model)
+
+
+def stream_messages(messages, model, data_model, **kwargs):
+    """
+    Streams a completion for messages, validating it against data_model as it
+    arrives. Returns the full response text, or raises FieldValidationError as soon
+    as a field is invalid, without waiting for the rest of the generation.
+    """
+    validator = IncrementalValidator(data_model)
+    start = time.perf_counter()
+    chunks = get_client().stream(messages, model, **kwargs)
+    try:
+        for chunk in chunks:
+            _feed(validator, chunk, start, model)
+    finally:
+        chunks.close()
+    return validator.text
+
+
+async def async_stream_messages(messages, model, data_model, **kwargs):
+    validator = IncrementalValidator(data_model)
+    start = time.perf_counter()
+    chunks = get_client().astream(messages, model, **kwargs)
+    try:
+        async for chunk in chunks:
+            _feed(validator, chunk, start, model)
+    finally:
+        await chunks.aclose()
+    return validator.text
@@ -0,0 +1,138 @@
+"""
+Schema versions for stored results.
+
+Every row written to `scenes` carries a schema_hash: a digest of the data model's
+JSON schema (field descriptions and enum values included), the prompt template and
+the model. When any of them changes, the hash of existing rows no longer matches and
+`main.py --reextract-stale` re-processes just those rows.
+
+A data model whose fields are all sub-models (a --layers combination) is versioned
+per layer as well, so editing one layer's schema marks only that layer stale and only
+that layer is re-extracted. Layers nest: with --layers ComprehensionLayer each of its
+four sub-models is a layer of its own ("comprehension_layer.emotional_state", ...).
+"""
+import hashlib
+import json
+from functools import lru_cache
+
+HASH_CHARS = 16
+
+
+def _digest(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()[:HASH_CHARS]
+
+
+def _canonical(schema):
+    return json.dumps(schema, sort_keys=True, ensure_ascii=False)
+
+
+def layer_models(data_model):
+    """
+    {field name: sub-model} when every field of data_model is a Pydantic model,
+    else {} (the model is versioned as a whole).
+    """
+    from pydantic import BaseModel
+
+    layers = {}
+    for name, field in data_model.model_fields.items():
+        annotation = field.annotation
+        if not (isinstance(annotation, type) and issubclass(annotation, BaseModel)):
+            return {}
+        layers[name] = annotation
+    return layers
+
+
+def _layer_hashes(data_model, prefix, context, prompt_template, model):
+    schema = data_model.model_json_schema()
+    hashes = {}
+    for name, layer in layer_models(data_model).items():
+        # the enclosing model's own description is left out: for a combined model it
+        # repeats every layer's docstring, so it would tie all layers together
+        scope = context + (_canonical(schema["properties"][name]),)
+        nested = _layer_hashes(layer, f"{prefix}{name}.", scope, prompt_template, model)
+        if nested:
+            hashes.update(nested)
+        else:
+            hashes[prefix + name] = _digest(*scope, _canonical(layer.model_json_schema()), prompt_template, model)
+    return hashes
+
+
+class SchemaVersion:
+    """
+    schema_hash for the whole result and layer_hashes ({layer: hash}, empty for
+    models without layers). `layers` names the layers a partial result covers;
+    None means the result is complete.
+    """
+
+    def __init__(self, schema_hash, layer_hashes, layers=None):
+        self.schema_hash = schema_hash
+        self.layer_hashes = layer_hashes
+        self.layers = layers
+
+    def for_layers(self, layers):
+        return SchemaVersion(self.schema_hash, self.layer_hashes, tuple(layers) if layers else None)
+
+    def layer_hashes_json(self):
+        return json.dumps(self.layer_hashes, sort_keys=True) if self.layer_hashes else None
+
+
+def schema_version(data_model, prompt_template, model):
+    """
+    Current SchemaVersion of results extracted with data_model, prompt_template and
+    model (a model name, or any label identifying e.g. a cascade).
+
+    A layer's hash covers its own schema (title and description included) and its
+    field entries in the enclosing schemas. Any other change, such as an enclosing
+    model's docstring, shows only in schema_hash and re-extracts whole rows.
+    """
+    schema_hash = _digest(_canonical(data_model.model_json_schema()), prompt_template, model)
+    return SchemaVersion(schema_hash, _layer_hashes(data_model, "", (), prompt_template, model))
+
+
+def stale_layers(version, schema_hash, layer_hashes):
+    """
+    What a stored row needs under the current `version`: None if it is current, ()
+    to re-extract it whole, or the names of the layers whose schema changed.
+    `schema_hash` and `layer_hashes` (JSON text) are the row's stored values.
+    """
+    if schema_hash == version.schema_hash:
+        return None
+    if not version.layer_hashes or not layer_hashes:
+        return ()
+    stored = json.loads(layer_hashes)
+    stale = tuple(name for name, value in version.layer_hashes.items() if stored.get(name) != value)
+    # nothing stale per layer means the layer set itself changed
+    if not stale or len(stale) == len(version.layer_hashes):
+        return ()
+    return stale
+
+
+@lru_cache(maxsize=None)
+def partial_model(data_model, layers):
+    """
+    data_model restricted to `layers` (a tuple of dotted layer paths), under the
+    same names and docstrings, for re-extracting only those layers.
+    """
+    from pydantic import create_model
+
+    nested = {}
+    for path in layers:
+        name, _, rest = path.partition(".")
+        if not rest:
+            nested[name] = None  # the whole field
+        elif nested.setdefault(name, set()) is not None:
+            nested[name].add(rest)
+    fields = {}
+    for name, field in data_model.model_fields.items():  # in the model's field order
+        if name not in nested:
+            continue
+        rest = nested[name]
+        annotation = field.annotation if rest is None else partial_model(field.annotation, tuple(sorted(rest)))
+        fields[name] = (annotation, field)
+    partial = create_model(data_model.__name__, **fields)
+    partial.__doc__ = data_model.__doc__
+    return partial
@@ -1,12 +1,28 @@
-from extraction_chain.extraction_chain import extraction_chain
-from extraction_chain.data_models import SocialEventAnalysis, SocialNormativeContext
-from extraction_chain.prompt_template import prompt_template
-from db import DEFAULT_DB_PATH, store_scene
-
 import argparse
+import asyncio
 import json
+import sys
+from typing import Optional, TextIO
 
-if __name__ == "__main__":
+# Only lightweight modules at import time: LangChain, Pydantic and the OpenAI SDK are
+# imported inside main() once arguments are parsed, so --help and argument errors are fast.
+from batch import DEFAULT_CONCURRENCY
+from db import DEFAULT_DB_PATH, STORAGE_FORMATS
+from extraction_chain.cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_ENTRIES
+from extraction_chain.client import DEFAULT_MAX_RETRIES, DEFAULT_TIMEOUT
+from extraction_chain.extraction_chain import DEFAULT_MAX_REPAIRS
+from extraction_chain.frames import (
+    DEFAULT_FRAME_CACHE_PATH,
+    DEFAULT_MAX_FRAMES,
+    DEFAULT_MAX_SIDE,
+    DEFAULT_THRESHOLD,
+    DETAILS,
+)
+from extraction_chain.routing import DEFAULT_CONSISTENCY_PATHS, DEFAULT_SAMPLES
+from extraction_chain import instrumentation
+
+
+def main() -> None:
     parser = argparse.ArgumentParser(description="Process some input text.")
     parser.add_argument("--text", type=str, help="Input text prompt for social analysis")
     parser.add_argument(
@@ -14,29 +30,454 @@ if __name__ == "__main__":
         type=str,
         help="Scene identifier to store with the output (required if the output schema lacks scene_id)",
     )
+    parser.add_argument(
+        "--input",
+        type=str,
+        help="JSONL or CSV file of scenes (scene_id, text) to process as a batch instead of --text",
+    )
+    parser.add_argument(
+        "--frames",
+        type=str,
+        default=None,
+        help="Video frames sent as images with --text: a directory (sorted by file name) or a glob; "
+        "in --input files, give each scene a `frames` entry instead",
+    )
+    parser.add_argument(
+        "--max-frames",
+        type=int,
+        default=DEFAULT_MAX_FRAMES,
+        help="Most keyframes sent per scene",
+    )
+    parser.add_argument(
+        "--frame-threshold",
+        type=int,
+        default=DEFAULT_THRESHOLD,
+        help="Perceptual-hash bits (of 64) a frame must differ from the last keyframe by to be kept",
+    )
+    parser.add_argument(
+        "--frame-side",
+        type=int,
+        default=DEFAULT_MAX_SIDE,
+        help="Longest side in pixels that keyframes are downscaled to",
+    )
+    parser.add_argument(
+        "--frame-detail",
+        choices=DETAILS,
+        default="low",
+        help="Image detail: low is a flat 85 tokens per frame, high is billed per 512px tile",
+    )
+    parser.add_argument(
+        "--image-token-budget",
+        type=int,
+        default=None,
+        help="Cap on image tokens per scene (lowers --max-frames to fit)",
+    )
+    parser.add_argument(
+        "--frame-cache",
+        type=str,
+        default=str(DEFAULT_FRAME_CACHE_PATH),
+        help="SQLite cache of frame hashes and encoded keyframes (unused with --no-cache)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help="Maximum number of model requests in flight in batch mode (per worker with --workers)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Split --input by scene_id hash across this many processes, each writing its own "
+        "shard database, and merge the shards into --db at the end",
+    )
+    parser.add_argument("--model", type=str, default="gpt-4o", help="Model used for extraction")
+    parser.add_argument(
+        "--cascade",
+        type=str,
+        default=None,
+        metavar="MODELS",
+        help="Comma-separated models tried cheapest first (e.g. gpt-4o-mini,gpt-4o); "
+        "a scene escalates when its answer fails validation or its samples disagree",
+    )
+    parser.add_argument(
+        "--cascade-samples",
+        type=int,
+        default=DEFAULT_SAMPLES,
+        help="Samples requested from each non-final cascade tier for the consistency check",
+    )
+    parser.add_argument(
+        "--consistency-path",
+        type=str,
+        action="append",
+        default=None,
+        help="Dotted result path the cascade samples must agree on (repeatable, default verdict.judgment)",
+    )
+    parser.add_argument(
+        "--layers",
+        type=str,
+        help="Comma-separated data_models classes to extract in one call "
+        "(e.g. PerceptionLayer,EmotionContext); defaults to SocialNormativeContext",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="With --input: skip scenes the jobs table marks done; rerun failed and interrupted ones",
+    )
+    parser.add_argument(
+        "--reextract-stale",
+        action="store_true",
+        help="With --input: re-process only stored scenes whose schema, prompt or model hash no longer "
+        "matches (just the changed layers where possible); scenes not in --db are skipped",
+    )
     parser.add_argument(
         "--db",
         type=str,
         default=str(DEFAULT_DB_PATH),
         help="Path to SQLite database for storing outputs",
     )
+    parser.add_argument(
+        "--storage",
+        choices=STORAGE_FORMATS,
+        default="json",
+        help="'coded' stores enum fields as integer codes in a compact per-schema table",
+    )
     parser.add_argument(
         "--no-db",
         action="store_true",
         help="Skip writing the output to the database",
     )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        default=str(DEFAULT_CACHE_PATH),
+        help="Path to the on-disk response cache",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Bypass the response cache (neither read nor write it)",
+    )
+    parser.add_argument(
+        "--clear-cache",
+        action="store_true",
+        help="Delete every cached response before running (exits if no --text/--input is given)",
+    )
+    parser.add_argument(
+        "--cache-max-entries",
+        type=int,
+        default=DEFAULT_MAX_ENTRIES,
+        help="Evict least recently used responses beyond this many entries",
+    )
+    parser.add_argument(
+        "--cache-max-age",
+        type=float,
+        default=None,
+        help="Treat cached responses older than this many seconds as misses",
+    )
+    parser.add_argument(
+        "--structured",
+        action="store_true",
+        help="Send the schema as a JSON-schema response_format instead of format instructions in the prompt",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream responses and validate each field as it arrives; abort and re-ask at the first invalid field",
+    )
+    parser.add_argument(
+        "--max-repairs",
+        type=int,
+        default=DEFAULT_MAX_REPAIRS,
+        help="Re-ask the model this many times with the validation error when a response does not validate",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help="Per-request timeout in seconds for model calls",
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=DEFAULT_MAX_RETRIES,
+        help="Retries (with jittered backoff) on 429, 5xx, timeout and connection errors",
+    )
+    parser.add_argument("--rpm", type=float, default=None, help="Client-side requests-per-minute limit")
+    parser.add_argument("--tpm", type=float, default=None, help="Client-side tokens-per-minute limit")
+    parser.add_argument(
+        "--record",
+        type=str,
+        metavar="FIXTURE",
+        default=None,
+        help="Append every model response to this JSONL fixture for later --replay",
+    )
+    parser.add_argument(
+        "--replay",
+        type=str,
+        metavar="FIXTURE",
+        default=None,
+        help="Answer model calls from a fixture recorded with --record instead of the API",
+    )
+    parser.add_argument(
+        "--replay-latency",
+        type=float,
+        default=0.0,
+        help="Synthetic seconds per replayed call (with --replay)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Time each pipeline stage and print p50/p95/p99 per stage plus token usage to stderr at the end",
+    )
+    parser.add_argument(
+        "--profile-log",
+        type=str,
+        default=None,
+        help="Also write every timed event as one JSON line to this file (implies --profile)",
+    )
     args = parser.parse_args()
+    if not args.text and not args.input and not args.frames and not args.clear_cache:
+        parser.error("--text or --input is required")
+    if args.clear_cache and args.no_cache:
+        parser.error("--clear-cache and --no-cache are mutually exclusive")
+    if args.frames and args.input:
+        parser.error("--frames is for single scenes; give each --input scene a `frames` entry instead")
+    if args.frames and args.cascade:
+        parser.error("--frames is not supported with --cascade")
+    if args.record and args.replay:
+        parser.error("--record and --replay are mutually exclusive")
+    if args.resume and (not args.input or args.no_db):
+        parser.error("--resume needs --input and a database (drop --no-db)")
+    if args.workers > 1 and (not args.input or args.no_db):
+        parser.error("--workers needs --input and a database (drop --no-db)")
+    if args.workers > 1 and (args.record or args.profile or args.profile_log):
+        parser.error("--record and --profile are not supported with --workers")
+    if args.stream and args.cascade:
+        parser.error("--stream is not supported with --cascade")
+    if args.reextract_stale and (not args.input or args.no_db):
+        parser.error("--reextract-stale needs --input and a database (drop --no-db)")
+    if args.reextract_stale and (args.resume or args.workers > 1 or args.storage != "json"):
+        parser.error("--reextract-stale is not supported with --resume, --workers or --storage coded")
 
-    result = extraction_chain(
-        input=args.text,
-        data_model=SocialNormativeContext,
-        prompt_template=prompt_template,
-        reasoning_model="gpt-4o"
-    )
+    from extraction_chain.cache import ResponseCache
+
+    cache = None
+    if not args.no_cache:
+        cache = ResponseCache(args.cache, max_entries=args.cache_max_entries, max_age=args.cache_max_age)
+        if args.clear_cache:
+            print(f"Cleared {cache.clear()} cached responses.", file=sys.stderr)
+            if not args.text and not args.input and not args.frames:
+                raise SystemExit(0)
+
+    profile_log = open(args.profile_log, "w", encoding="utf-8") if args.profile_log else None
+    if args.profile or profile_log is not None:
+        instrumentation.enable(profile_log)
+
+    from batch import load_scenes, reextract_stale, run_batch
+    from db import store_scene
+    from extraction_chain.extraction_chain import extraction_chain, resolve_layers
+    from extraction_chain.image_perception import configure_client, set_client
+    from extraction_chain.prompt_template import prompt_template, structured_prompt_template
+    from extraction_chain.versioning import schema_version
+
+    if args.structured:
+        prompt_template = structured_prompt_template
+
+    layers = [name.strip() for name in (args.layers or "").split(",") if name.strip()]
+    try:
+        data_model = resolve_layers(layers)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    cascade = None
+    if args.cascade:
+        cascade = {
+            "tiers": [name.strip() for name in args.cascade.split(",") if name.strip()],
+            "samples": args.cascade_samples,
+            "consistency_paths": args.consistency_path or list(DEFAULT_CONSISTENCY_PATHS),
+        }
+        if not cascade["tiers"]:
+            parser.error("--cascade needs at least one model")
+    # what stored rows are versioned against: the model, or every tier of the cascade
+    model_label = "cascade:" + ",".join(cascade["tiers"]) if cascade else args.model
+
+    frame_options = {
+        "sampler": {
+            "threshold": args.frame_threshold,
+            "max_frames": args.max_frames,
+            "max_side": args.frame_side,
+            "detail": args.frame_detail,
+            "max_image_tokens": args.image_token_budget,
+        },
+        "cache": None if args.no_cache else args.frame_cache,
+    }
+
+    if args.input and args.workers > 1:
+        from shard import run_sharded
+
+        options = {
+            "layers": layers,
+            "prompt_template": prompt_template,
+            "reasoning_model": args.model,
+            "model_label": model_label,
+            "cascade": cascade,
+            "concurrency": args.concurrency,
+            "storage": args.storage,
+            "resume": args.resume,
+            "structured": args.structured,
+            "max_repairs": args.max_repairs,
+            "stream": args.stream,
+            "frames": frame_options,
+            "replay": args.replay,
+            "replay_latency": args.replay_latency,
+            # the RPM/TPM budget is shared by all workers
+            "client": {
+                "timeout": args.timeout,
+                "max_retries": args.max_retries,
+                "max_connections": max(args.concurrency, 1),
+                "rpm": args.rpm / args.workers if args.rpm else None,
+                "tpm": args.tpm / args.workers if args.tpm else None,
+            },
+            "cache": None if cache is None else {
+                "path": args.cache,
+                "max_entries": args.cache_max_entries,
+                "max_age": args.cache_max_age,
+            },
+        }
+        stats = run_sharded(args.input, args.workers, args.db, options, data_model=data_model)
+        print(json.dumps(stats))
+        raise SystemExit(1 if stats["failed"] else 0)
+
+    if args.replay:
+        from extraction_chain.replay import ReplayClient
+
+        client = set_client(ReplayClient(args.replay, latency=args.replay_latency))
+    else:
+        client = configure_client(
+            timeout=args.timeout,
+            max_retries=args.max_retries,
+            max_connections=max(args.concurrency, 1),
+            rpm=args.rpm,
+            tpm=args.tpm,
+        )
+        if args.record:
+            from extraction_chain.replay import RecordingClient
+
+            client = set_client(RecordingClient(client, args.record))
+
+    router = None
+    if cascade is not None:
+        from extraction_chain.routing import CascadeRouter
+
+        router = CascadeRouter(**cascade)
+
+    sampler = None
+    scenes = list(load_scenes(args.input)) if args.input else []
+    if args.frames or any(scene.get("frames") for scene in scenes):
+        from extraction_chain.frames import FrameCache, FrameSampler
+
+        frame_cache = FrameCache(frame_options["cache"]) if frame_options["cache"] else None
+        sampler = FrameSampler(**frame_options["sampler"], cache=frame_cache)
+
+    version = schema_version(data_model, prompt_template, model_label)
+    if args.input and args.reextract_stale:
+        stats = asyncio.run(
+            reextract_stale(
+                scenes,
+                data_model=data_model,
+                prompt_template=prompt_template,
+                reasoning_model=args.model,
+                db_path=args.db,
+                model_label=model_label,
+                concurrency=args.concurrency,
+                cache=cache,
+                structured=args.structured,
+                max_repairs=args.max_repairs,
+                router=router,
+                stream=args.stream,
+                sampler=sampler,
+            )
+        )
+    elif args.input:
+        stats = asyncio.run(
+            run_batch(
+                scenes,
+                data_model=data_model,
+                prompt_template=prompt_template,
+                reasoning_model=args.model,
+                concurrency=args.concurrency,
+                db_path=None if args.no_db else args.db,
+                cache=cache,
+                storage=args.storage,
+                resume=args.resume,
+                structured=args.structured,
+                max_repairs=args.max_repairs,
+                router=router,
+                stream=args.stream,
+                sampler=sampler,
+                version=version,
+            )
+        )
+    if args.input:
+        stats["retries"] = client.retries
+        stats["usage"] = client.usage.summary()
+        if cache is not None:
+            stats["cache"] = cache.stats()
+            cache.close()
+        if router is not None:
+            stats["routing"] = router.stats()
+        if sampler is not None:
+            stats["frames"] = sampler.stats()
+        print(json.dumps(stats))
+        report_profile(profile_log)
+        raise SystemExit(1 if stats["failed"] else 0)
+
+    instrumentation.current_scene_id.set(args.scene_id)
+    images = sampler.prepare(args.frames) if args.frames else None
+    if router is not None:
+        result = router.extract(
+            args.text,
+            data_model,
+            prompt_template,
+            cache=cache,
+            structured=args.structured,
+            max_repairs=args.max_repairs,
+        )
+        print(json.dumps({"routing": router.stats()}), file=sys.stderr)
+    else:
+        result = extraction_chain(
+            input=args.text or "",
+            data_model=data_model,
+            prompt_template=prompt_template,
+            reasoning_model=args.model,
+            cache=cache,
+            structured=args.structured,
+            max_repairs=args.max_repairs,
+            stream=args.stream,
+            images=images,
+        )
     if not args.no_db:
-        store_scene(result, args.db, scene_id=args.scene_id)
+        store_scene(
+            result, args.db, scene_id=args.scene_id, data_model=data_model, storage=args.storage, version=version
+        )
 
     with open("output.json", "w") as f:
         json.dump(result, f, indent=4)
 
     print(result)
+    if cache is not None:
+        cache.close()
+    report_profile(profile_log)
+
+
+def report_profile(profile_log: Optional[TextIO]) -> None:
+    profiler = instrumentation.disable()
+    if profile_log is not None:
+        profile_log.close()
+    if profiler is not None:
+        print(json.dumps({"profile": profiler.summary()}, indent=2), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
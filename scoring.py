@@ -0,0 +1,323 @@
+"""
+Scores stored predictions against gold annotations, one enum field at a time.
+
+Both sides are loaded into integer-coded NumPy arrays (one column per enum path of
+the data model, codes from extraction_chain.enum_codes), aligned on scene_id, and
+every metric is computed from per-field confusion matrices:
+
+    python scoring.py --gold gold.jsonl --db eqbench.db
+    python scoring.py --gold gold.db --predictions run.jsonl --layers PerceptionLayer
+
+Gold and predictions may each be a SQLite database written by main.py (the scenes
+table, or a coded_<model> table with --table) or a JSONL file in the shape of
+`db_query.py --ndjson` output: {"scene_id": ..., "data_json": {...}} per line (a bare
+result object with a scene_id key works too). A .json file is read as one document:
+a single result such as main.py's output.json, or a list of such records.
+
+A value that is absent (e.g. verdict.violations.cause_category when there is no
+violation) gets its own "<missing>" class, so agreeing that a nested object is absent
+counts as correct.
+"""
+import argparse
+import json
+import sqlite3
+import sys
+from itertools import repeat
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Sequence, Tuple, Type, Union
+
+import numpy as np
+import orjson
+
+from db import DEFAULT_DB_PATH, coded_fields
+from extraction_chain.enum_codes import enum_fields, value_to_code
+
+MISSING = "<missing>"
+DEFAULT_BOOTSTRAP = 1000
+DEFAULT_CONFIDENCE = 0.95
+
+
+class Labels:
+    """
+    Integer-coded labels: scene_ids (sorted, unique) and one code column per enum path.
+    Column codes are the enum member positions; len(members) marks a missing value.
+    """
+
+    def __init__(self, scene_ids: np.ndarray, columns: Dict[str, np.ndarray]) -> None:
+        # sorted and de-duplicated; a scene_id listed twice keeps its last row
+        last = len(scene_ids) - 1
+        self.scene_ids, first_reversed = np.unique(scene_ids[::-1].astype(str), return_index=True)
+        keep = last - first_reversed
+        self.columns = {path: codes[keep] for path, codes in columns.items()}
+
+    def __len__(self) -> int:
+        return len(self.scene_ids)
+
+
+def scalar_paths(fields: Dict[str, Type[Any]]) -> Dict[str, Type[Any]]:
+    # list-valued enum paths ("[]") have no single label per scene
+    return {path: enum for path, enum in fields.items() if "[]" not in path}
+
+
+def encode_values(values: Sequence[Any], enum: Type[Any]) -> np.ndarray:
+    """
+    Enum values (or None for missing) -> int16 codes, in one pass straight into a
+    NumPy buffer. Anything that is not a member of the enum (a malformed prediction)
+    scores like a missing value.
+    """
+    lookup = value_to_code(enum)
+    missing = len(lookup)
+    return np.fromiter(map(lookup.get, values, repeat(missing)), dtype=np.int16, count=len(values))
+
+
+def load_sqlite(
+    path: Union[str, Path],
+    data_model: Type[Any],
+    table: str = "scenes",
+) -> Labels:
+    fields = scalar_paths(enum_fields(data_model))
+    conn = sqlite3.connect(str(path))
+    try:
+        if not fields:
+            # nothing to score; the query below needs at least one path
+            if table != "scenes" and table not in coded_fields(conn):
+                raise SystemExit(f"Unknown table: {table}")
+            scene_ids = [row[0] for row in conn.execute(f"SELECT scene_id FROM {table}")]
+            return Labels(np.array(scene_ids, dtype=object), {})
+        if table == "scenes":
+            # json_extract with several paths parses each document once and returns a
+            # JSON array of the values (with a single path it returns the bare value)
+            paths = ", ".join(f"'$.{field}'" for field in fields)
+            rows = conn.execute(f"SELECT scene_id, json_extract(data_json, {paths}) FROM scenes").fetchall()
+            scene_ids = [row[0] for row in rows]
+            if len(fields) == 1:
+                extracted = [[row[1]] for row in rows]
+            else:
+                extracted = [orjson.loads(row[1]) for row in rows]
+            values = [scene_ids] + (list(zip(*extracted)) if rows else [()] * len(fields))
+            encoded = {field: encode_values(values[i + 1], enum) for i, (field, enum) in enumerate(fields.items())}
+        else:
+            tables = coded_fields(conn)
+            if table not in tables:
+                raise SystemExit(f"Unknown table: {table}")
+            mapping = dict(
+                conn.execute("SELECT path, column_name FROM coded_columns WHERE table_name = ?", (table,)).fetchall()
+            )
+            selects = [mapping.get(field) or "NULL" for field in fields]
+            rows = conn.execute(f"SELECT scene_id, {', '.join(selects)} FROM {table}").fetchall()
+            values = list(zip(*rows)) if rows else [()] * (len(fields) + 1)
+            encoded = {}
+            for i, (field, enum) in enumerate(fields.items()):
+                # the database's own codes, translated to member positions through its
+                # enum_codes labels; NULL and values no longer in the enum -> missing
+                lookup = value_to_code(enum)
+                labels = tables[table].get(field, {})
+                translate = np.full(max(labels, default=-1) + 2, len(lookup), dtype=np.int16)
+                for code, value in labels.items():
+                    translate[code] = lookup.get(value, len(lookup))
+                stored = np.array([-1 if code is None else code for code in values[i + 1]], dtype=np.int64)
+                encoded[field] = translate[stored]
+    finally:
+        conn.close()
+    return Labels(np.array(values[0], dtype=object), encoded)
+
+
+def load_records(records: Iterable[Dict[str, Any]], data_model: Type[Any]) -> Labels:
+    """
+    Labels from {"scene_id": ..., "data_json": {...}} records (or bare results with a
+    scene_id key).
+    """
+    fields = scalar_paths(enum_fields(data_model))
+    parts = {field: field.split(".") for field in fields}
+    scene_ids: List[str] = []
+    values: Dict[str, List[Any]] = {field: [] for field in fields}
+    for record in records:
+        scene_ids.append(str(record["scene_id"]))
+        data = record.get("data_json", record)
+        if isinstance(data, str):
+            data = orjson.loads(data)
+        for field, keys in parts.items():
+            node = data
+            for key in keys:
+                node = node.get(key) if isinstance(node, dict) else None
+            values[field].append(node)
+    encoded = {field: encode_values(values[field], enum) for field, enum in fields.items()}
+    return Labels(np.array(scene_ids, dtype=object), encoded)
+
+
+def load_jsonl(path: Union[str, Path], data_model: Type[Any]) -> Labels:
+    with open(path, "rb") as f:
+        return load_records((orjson.loads(line) for line in f if line.strip()), data_model)
+
+
+def load_json(path: Union[str, Path], data_model: Type[Any]) -> Labels:
+    """
+    A single JSON document: one result (e.g. main.py's output.json) or a list of records.
+    """
+    with open(path, "rb") as f:
+        document = orjson.loads(f.read())
+    return load_records(document if isinstance(document, list) else [document], data_model)
+
+
+def load_labels(path: Union[str, Path], data_model: Type[Any], table: str = "scenes") -> Labels:
+    if not Path(path).exists():
+        raise SystemExit(f"Not found: {path}")
+    suffix = Path(path).suffix.lower()
+    if suffix in (".jsonl", ".ndjson"):
+        return load_jsonl(path, data_model)
+    if suffix == ".json":
+        return load_json(path, data_model)
+    return load_sqlite(path, data_model, table)
+
+
+def align(gold: Labels, predictions: Labels) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Row indices into gold and predictions for the scene_ids present in both.
+    """
+    _, gold_index, pred_index = np.intersect1d(
+        gold.scene_ids, predictions.scene_ids, assume_unique=True, return_indices=True
+    )
+    return gold_index, pred_index
+
+
+def confusion_matrix(gold: np.ndarray, predicted: np.ndarray, classes: int) -> np.ndarray:
+    """
+    classes x classes counts; rows are gold labels, columns predictions.
+    """
+    flat = gold.astype(np.int64) * classes + predicted.astype(np.int64)
+    return np.bincount(flat, minlength=classes * classes).reshape(classes, classes)
+
+
+def accuracy_and_macro_f1(confusion: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Accuracy and macro-F1 for one confusion matrix or a stack of them (..., k, k).
+    Macro-F1 averages over the classes that occur in gold or predictions.
+    """
+    confusion = confusion.astype(np.float64)
+    total = confusion.sum(axis=(-2, -1))
+    true_positive = np.diagonal(confusion, axis1=-2, axis2=-1)
+    gold_count = confusion.sum(axis=-1)
+    pred_count = confusion.sum(axis=-2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        accuracy = np.where(total > 0, true_positive.sum(axis=-1) / total, np.nan)
+        f1 = np.where(gold_count + pred_count > 0, 2 * true_positive / (gold_count + pred_count), 0.0)
+        present = (gold_count + pred_count) > 0
+        macro_f1 = np.where(present.any(axis=-1), f1.sum(axis=-1) / present.sum(axis=-1), np.nan)
+    return accuracy, macro_f1
+
+
+def bootstrap_intervals(
+    confusion: np.ndarray,
+    samples: int = DEFAULT_BOOTSTRAP,
+    confidence: float = DEFAULT_CONFIDENCE,
+    seed: int = 0,
+) -> Dict[str, Tuple[float, float]]:
+    """
+    Percentile bootstrap intervals for accuracy and macro-F1.
+
+    Both metrics depend only on the confusion counts, so resampling n scenes with
+    replacement is the same as drawing the k*k cell counts from a multinomial with the
+    observed cell frequencies: one (samples, k*k) draw instead of samples * n indices.
+    """
+    n = int(confusion.sum())
+    if n == 0 or samples < 1:
+        return {"accuracy": (float("nan"), float("nan")), "macro_f1": (float("nan"), float("nan"))}
+    rng = np.random.default_rng(seed)
+    draws = rng.multinomial(n, confusion.ravel() / n, size=samples).reshape((samples,) + confusion.shape)
+    accuracy, macro_f1 = accuracy_and_macro_f1(draws)
+    tail = (1.0 - confidence) / 2 * 100
+    bounds = {}
+    for name, values in (("accuracy", accuracy), ("macro_f1", macro_f1)):
+        low, high = np.nanpercentile(values, [tail, 100 - tail])
+        bounds[name] = (float(low), float(high))
+    return bounds
+
+
+def score(
+    gold: Labels,
+    predictions: Labels,
+    data_model: Type[Any],
+    bootstrap: int = DEFAULT_BOOTSTRAP,
+    confidence: float = DEFAULT_CONFIDENCE,
+    seed: int = 0,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    {path: {n, accuracy, accuracy_ci, macro_f1, macro_f1_ci, labels, confusion}} for
+    every enum path, over the scenes present in both gold and predictions.
+    """
+    gold_index, pred_index = align(gold, predictions)
+    results: Dict[str, Dict[str, Any]] = {}
+    for path, enum in scalar_paths(enum_fields(data_model)).items():
+        labels = [member.value for member in enum] + [MISSING]
+        confusion = confusion_matrix(
+            gold.columns[path][gold_index], predictions.columns[path][pred_index], len(labels)
+        )
+        accuracy, macro_f1 = accuracy_and_macro_f1(confusion)
+        intervals = bootstrap_intervals(confusion, bootstrap, confidence, seed)
+        results[path] = {
+            "n": int(confusion.sum()),
+            "accuracy": float(accuracy),
+            "accuracy_ci": intervals["accuracy"],
+            "macro_f1": float(macro_f1),
+            "macro_f1_ci": intervals["macro_f1"],
+            "labels": labels,
+            "confusion": confusion.tolist(),
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Score stored predictions against gold labels.")
+    parser.add_argument("--gold", type=str, required=True, help="Gold labels: SQLite database, JSONL or JSON")
+    parser.add_argument(
+        "--predictions",
+        type=str,
+        default=None,
+        help="Predictions: SQLite database, JSONL or JSON (default: --db)",
+    )
+    parser.add_argument("--db", type=str, default=str(DEFAULT_DB_PATH), help="Database with predictions")
+    parser.add_argument(
+        "--table",
+        type=str,
+        default="scenes",
+        help="Table to read from SQLite inputs: scenes (default) or a coded_<model> table",
+    )
+    parser.add_argument(
+        "--layers",
+        type=str,
+        default=None,
+        help="Comma-separated layer names the results were extracted with (as for main.py)",
+    )
+    parser.add_argument("--bootstrap", type=int, default=DEFAULT_BOOTSTRAP, help="Bootstrap resamples (0 to skip)")
+    parser.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--confusion", action="store_true", help="Include labels and confusion matrices")
+    args = parser.parse_args()
+
+    from extraction_chain.extraction_chain import resolve_layers
+
+    layers = [name.strip() for name in (args.layers or "").split(",") if name.strip()]
+    try:
+        data_model = resolve_layers(layers)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    gold = load_labels(args.gold, data_model, args.table)
+    predictions = load_labels(args.predictions or args.db, data_model, args.table)
+    results = score(gold, predictions, data_model, args.bootstrap, args.confidence, args.seed)
+    for path, item in results.items():
+        if not args.confusion:
+            item = {key: value for key, value in item.items() if key not in ("labels", "confusion")}
+        print(json.dumps({"path": path, **item}, ensure_ascii=True))
+    if results:
+        mean_accuracy = float(np.nanmean([item["accuracy"] for item in results.values()]))
+        mean_f1 = float(np.nanmean([item["macro_f1"] for item in results.values()]))
+        n = next(iter(results.values()))["n"]
+        print(json.dumps({"path": "*", "n": n, "mean_accuracy": mean_accuracy, "mean_macro_f1": mean_f1}), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except BrokenPipeError:
+        sys.stderr.close()
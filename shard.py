@@ -0,0 +1,286 @@
+import asyncio
+import multiprocessing
+import sqlite3
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Type, Union
+
+from batch import DEFAULT_CONCURRENCY, load_scenes, run_batch
+from db import (
+    coded_table_name,
+    completed_scene_ids,
+    configure_connection,
+    init_coded_table,
+    init_db,
+    init_enum_codes,
+    init_jobs,
+)
+
+# "WHERE true" is required before ON CONFLICT in an INSERT ... SELECT
+MERGE_SCENES_SQL = """
+    INSERT INTO main.scenes (scene_id, data_json, created_at, updated_at, schema_hash, layer_hashes)
+    SELECT scene_id, data_json, created_at, updated_at, schema_hash, layer_hashes FROM shard.scenes WHERE true
+    ON CONFLICT(scene_id) DO UPDATE SET
+        data_json = excluded.data_json,
+        updated_at = excluded.updated_at,
+        schema_hash = excluded.schema_hash,
+        layer_hashes = excluded.layer_hashes
+"""
+
+
+def shard_of(scene_id: str, shards: int) -> int:
+    """
+    Stable shard index for a scene_id (crc32, so it does not change between runs or
+    processes the way hash() does).
+    """
+    return zlib.crc32(scene_id.encode("utf-8")) % shards
+
+
+def shard_path(db_path: Union[str, Path], index: int) -> Path:
+    """
+    eqbench.db -> eqbench.shard3.db, next to the target database.
+    """
+    db_path = Path(db_path)
+    return db_path.with_name(f"{db_path.stem}.shard{index}{db_path.suffix}")
+
+
+def run_shard(index: int, shards: int, input_path: str, db_path: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Worker entry point: runs the scenes of `input_path` that hash to `index` through
+    run_batch, writing to this shard's own database. Every worker reads the corpus
+    itself and keeps only its share, so scenes are never pickled between processes.
+    """
+    from extraction_chain.cache import ResponseCache
+    from extraction_chain.extraction_chain import resolve_layers
+    from extraction_chain.image_perception import configure_client, set_client
+    from extraction_chain.versioning import schema_version
+
+    if options.get("replay"):
+        from extraction_chain.replay import ReplayClient
+
+        client = set_client(ReplayClient(options["replay"], latency=options.get("replay_latency", 0.0)))
+    else:
+        client = configure_client(**options["client"])
+
+    cache = None
+    if options.get("cache"):
+        cache = ResponseCache(**options["cache"])
+
+    scenes = [scene for scene in load_scenes(input_path) if shard_of(scene["scene_id"], shards) == index]
+    skipped = 0
+    if options.get("resume"):
+        # scenes finished by earlier runs were merged into the target database
+        done = completed_scene_ids(db_path)
+        remaining = [scene for scene in scenes if scene["scene_id"] not in done]
+        skipped = len(scenes) - len(remaining)
+        scenes = remaining
+
+    sampler = None
+    if options.get("frames") and any(scene.get("frames") for scene in scenes):
+        from extraction_chain.frames import FrameCache, FrameSampler
+
+        frame_cache = options["frames"].get("cache")
+        sampler = FrameSampler(
+            **options["frames"]["sampler"], cache=FrameCache(frame_cache) if frame_cache else None
+        )
+
+    router = None
+    if options.get("cascade"):
+        from extraction_chain.routing import CascadeRouter
+
+        router = CascadeRouter(**options["cascade"])
+
+    data_model = resolve_layers(options.get("layers") or [])
+    version = schema_version(
+        data_model, options["prompt_template"], options.get("model_label") or options["reasoning_model"]
+    )
+    stats = asyncio.run(
+        run_batch(
+            scenes,
+            data_model=data_model,
+            prompt_template=options["prompt_template"],
+            reasoning_model=options["reasoning_model"],
+            concurrency=options.get("concurrency", DEFAULT_CONCURRENCY),
+            db_path=shard_path(db_path, index),
+            cache=cache,
+            storage=options.get("storage", "json"),
+            resume=options.get("resume", False),
+            structured=options.get("structured", False),
+            max_repairs=options["max_repairs"],
+            router=router,
+            stream=options.get("stream", False),
+            sampler=sampler,
+            version=version,
+        )
+    )
+    stats["skipped"] += skipped
+    stats["retries"] = client.retries
+    stats["usage"] = client.usage.summary()
+    if cache is not None:
+        stats["cache"] = cache.stats()
+        cache.close()
+    if router is not None:
+        stats["routing"] = router.stats()
+    if sampler is not None:
+        stats["frames"] = sampler.stats()
+    return stats
+
+
+def merge_shards(
+    db_path: Union[str, Path],
+    shard_paths: Sequence[Union[str, Path]],
+    data_model: Optional[Type[Any]] = None,
+    storage: str = "json",
+    remove: bool = True,
+) -> int:
+    """
+    Upserts the scene rows and job states of every shard into db_path (via ATTACH, so
+    rows are copied inside SQLite without being decoded), then deletes the shard files
+    unless remove=False. Returns the number of scene rows merged.
+    """
+    conn = sqlite3.connect(str(db_path))
+    configure_connection(conn)
+    if storage == "coded":
+        init_coded_table(conn, data_model)
+        table = coded_table_name(data_model)
+    else:
+        init_db(conn)
+        table = "scenes"
+    init_jobs(conn)
+    conn.commit()
+
+    merged = 0
+    try:
+        for path in shard_paths:
+            if not Path(path).exists():
+                continue
+            conn.execute("ATTACH DATABASE ? AS shard", (str(path),))
+            try:
+                with conn:
+                    if table == "scenes":
+                        cursor = conn.execute(MERGE_SCENES_SQL)
+                    else:
+                        check_codes(conn, path)
+                        columns = [
+                            row[1]
+                            for row in conn.execute(f"PRAGMA shard.table_info({table})")
+                            if row[1] not in ("created_at", "updated_at")
+                        ]
+                        names = ", ".join(columns)
+                        cursor = conn.execute(
+                            f"INSERT OR REPLACE INTO main.{table} ({names}) SELECT {names} FROM shard.{table}"
+                        )
+                    merged += cursor.rowcount
+                    conn.execute("INSERT OR REPLACE INTO main.jobs SELECT * FROM shard.jobs")
+            finally:
+                conn.execute("DETACH DATABASE shard")
+    finally:
+        conn.close()
+
+    if remove:
+        for path in shard_paths:
+            for suffix in ("", "-wal", "-shm"):
+                Path(str(path) + suffix).unlink(missing_ok=True)
+    return merged
+
+
+def seed_enum_codes(db_path: Union[str, Path], shard_paths: Sequence[Union[str, Path]], data_model: Type[Any]) -> None:
+    """
+    Copies db_path's enum codes (after registering data_model's values) into each
+    shard, so coded rows use the target database's codes and merge without re-coding.
+    """
+    with sqlite3.connect(str(db_path)) as conn:
+        init_coded_table(conn, data_model)
+    conn.close()
+    for path in shard_paths:
+        conn = sqlite3.connect(str(path))
+        try:
+            init_enum_codes(conn)
+            conn.commit()
+            conn.execute("ATTACH DATABASE ? AS target", (str(db_path),))
+            with conn:
+                conn.execute("INSERT OR IGNORE INTO main.enum_codes SELECT * FROM target.enum_codes")
+            conn.execute("DETACH DATABASE target")
+        finally:
+            conn.close()
+
+
+def check_codes(conn: sqlite3.Connection, path: Union[str, Path]) -> None:
+    """
+    Raises ValueError if the attached shard codes a value differently from main.
+    """
+    row = conn.execute(
+        """
+        SELECT s.enum_name, s.value, s.code, m.code FROM shard.enum_codes s
+        JOIN main.enum_codes m ON m.enum_name = s.enum_name AND m.value = s.value
+        WHERE m.code != s.code LIMIT 1
+        """
+    ).fetchone()
+    if row is not None:
+        raise ValueError(f"{path}: {row[0]}.{row[1]!r} is coded {row[2]} there but {row[3]} in the target database")
+
+
+def run_sharded(
+    input_path: Union[str, Path],
+    workers: int,
+    db_path: Union[str, Path],
+    options: Dict[str, Any],
+    data_model: Optional[Type[Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Splits the corpus by scene_id hash across `workers` processes, each running its
+    own event loop and SceneWriter against a private shard database, then merges the
+    shards into db_path. Returns the summed stats of all workers.
+
+    Workers are started with the spawn method so no threads, sockets or SQLite
+    handles are inherited from the parent. Shards are only removed after a merge
+    that completed; a failed run leaves them in place and they are picked up by the
+    next merge.
+    """
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+    input_path = str(input_path)
+    db_path = str(db_path)
+    if options.get("storage") == "coded":
+        seed_enum_codes(db_path, [shard_path(db_path, index) for index in range(workers)], data_model)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = [
+            pool.submit(run_shard, index, workers, input_path, db_path, options)
+            for index in range(workers)
+        ]
+        results: List[Dict[str, Any]] = [future.result() for future in futures]
+
+    # shards left over from an earlier run with more workers are merged as well
+    paths = sorted(Path(db_path).parent.glob(f"{Path(db_path).stem}.shard*{Path(db_path).suffix}"))
+    merge_shards(db_path, paths, data_model=data_model, storage=options.get("storage", "json"))
+
+    stats: Dict[str, Any] = {"ok": 0, "failed": 0, "skipped": 0, "coalesced": 0, "retries": 0}
+    usage: Dict[str, int] = {}
+    for result in results:
+        for key in stats:
+            stats[key] += result.get(key, 0)
+        for key, value in result["usage"].items():
+            if key != "cached_ratio":
+                usage[key] = usage.get(key, 0) + value
+    usage["cached_ratio"] = round(usage["cached_tokens"] / usage["prompt_tokens"], 4) if usage.get("prompt_tokens") else 0.0
+    stats["workers"] = workers
+    stats["usage"] = usage
+    if options.get("cache"):
+        stats["cache"] = {
+            "hits": sum(result["cache"]["hits"] for result in results),
+            "misses": sum(result["cache"]["misses"] for result in results),
+            # every worker shares one cache file
+            "entries": max(result["cache"]["entries"] for result in results),
+        }
+    if options.get("cascade"):
+        from extraction_chain.routing import combine_stats
+
+        stats["routing"] = combine_stats([result["routing"] for result in results])
+    frames = [result["frames"] for result in results if "frames" in result]
+    if frames:
+        stats["frames"] = {
+            key: sum(item[key] for item in frames) for key in ("scenes", "frames", "keyframes", "image_tokens")
+        }
+    return stats
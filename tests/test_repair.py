@@ -0,0 +1,29 @@
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+import pytest
+
+from extraction_chain.data_models import ComprehensionLayer
+from extraction_chain.extraction_chain import compile_chain
+from extraction_chain.prompt_template import prompt_template
+from samples import sample_result
+
+
+def test_repair_message_names_the_failing_field():
+    chain = compile_chain(ComprehensionLayer, prompt_template)
+    result = sample_result(ComprehensionLayer, 0)
+    result["emotional_state"]["valence"] = "Not a valence"
+    response = json.dumps(result, indent=2)
+
+    with pytest.raises(ValueError) as caught:
+        chain.parse(response)
+    repair = chain.repair_messages(response, caught.value)[-1]["content"]
+
+    assert "emotional_state.valence: Input should be" in repair
+    # the completion is already in the assistant turn; it should not be echoed back
+    assert response[:200] not in repair